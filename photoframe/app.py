@@ -7,6 +7,8 @@ import time
 from werkzeug.utils import secure_filename
 import logging
 from epaper_display import EpaperPhotoFrame
+from playlist import PLAYLIST_MODES, PLAYLIST_NEWEST
+from waveshare_epd import epdconfig, epdquant
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -21,14 +23,32 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 class DisplayController:
     def __init__(self):
+        self.config = self.load_config()
+        # z.B. "simulated": Weboberflaeche und Bildaufbereitung ohne GPIO/SPI
+        if self.config.get('epd_backend'):
+            epdconfig.use_backend(self.config['epd_backend'])
+        # Prozesse fuer die Bildaufbereitung in Baendern, z.B. 4 auf einem Pi 4
+        epdquant.set_workers(self.config.get('render_workers', 0))
         self.frame = EpaperPhotoFrame()
+        # Bilder, die waehrend eines Refreshs im Voraus gerendert werden
+        self.frame.prefetcher.depth = self.config.get('prefetch_depth', 2)
+        # Fertige, noch nicht angezeigte Puffer im Frame-Cache (prefetch_budget_mb: alter Name)
+        ready_mb = self.config.get('prefetch_ready_mb', self.config.get('prefetch_budget_mb', 8))
+        self.frame.prefetcher.max_ready_bytes = ready_mb * 1024 * 1024
         self.running = False
         self.thread = None
-        self.config = self.load_config()
         self.frame.feed_url = self.config.get('feed_url', '')
         self.frame.enable_rotation = self.config.get('enable_rotation', True)
         self.frame.enable_resize = self.config.get('enable_resize', True)
         self.frame.display_interval = self.config.get('display_interval', 30)
+        self.frame.dither = self.config.get('dither', epdquant.DITHER_DEFAULT)
+        if self.frame.dither not in epdquant.DITHER_MODES:
+            logging.warning(f"Unbekanntes Dithering {self.frame.dither}, verwende {epdquant.DITHER_DEFAULT}")
+            self.frame.dither = epdquant.DITHER_DEFAULT
+        self.frame.playlist.mode = self.config.get('playlist_mode', PLAYLIST_NEWEST)
+        if self.frame.playlist.mode not in PLAYLIST_MODES:
+            logging.warning(f"Unbekannte Playlist {self.frame.playlist.mode}, verwende {PLAYLIST_NEWEST}")
+            self.frame.playlist.mode = PLAYLIST_NEWEST
         if self.config.get('running', False):
             self.start()
     
@@ -42,6 +62,8 @@ class DisplayController:
                 'enable_rotation': True,
                 'enable_resize': True,
                 'display_interval': 30,
+                'dither': epdquant.DITHER_DEFAULT,
+                'playlist_mode': PLAYLIST_NEWEST,
                 'running': False
             }
             with open('config.json', 'w') as f:
@@ -54,8 +76,15 @@ class DisplayController:
             'enable_rotation': self.frame.enable_rotation,
             'enable_resize': self.frame.enable_resize,
             'display_interval': self.frame.display_interval,
+            'dither': self.frame.dither,
+            'playlist_mode': self.frame.playlist.mode,
             'running': self.running
         }
+        for key in ('epd_backend', 'render_workers', 'prefetch_depth', 'prefetch_ready_mb'):
+            if key in self.config:
+                config[key] = self.config[key]
+        if 'prefetch_budget_mb' in self.config and 'prefetch_ready_mb' not in self.config:
+            config['prefetch_ready_mb'] = self.config['prefetch_budget_mb']
         with open('config.json', 'w') as f:
             json.dump(config, f)
     
@@ -94,7 +123,10 @@ class DisplayController:
             if not self.running:
                 break
 
-controller = DisplayController()
+# Die Render-Prozesse (forkserver) importieren dieses Modul als __mp_main__,
+# dort darf kein zweiter Controller das Display initialisieren
+if __name__ != '__mp_main__':
+    controller = DisplayController()
 
 @app.route('/')
 def index():
@@ -103,16 +135,28 @@ def index():
                          enable_rotation=controller.frame.enable_rotation,
                          enable_resize=controller.frame.enable_resize,
                          display_interval=controller.frame.display_interval,
+                         dither=controller.frame.dither,
+                         dither_modes=epdquant.DITHER_MODES,
+                         playlist_mode=controller.frame.playlist.mode,
+                         playlist_modes=PLAYLIST_MODES,
                          is_running=controller.running)
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
     try:
         data = request.json
+        dither = data.get('dither', controller.frame.dither)
+        if dither not in epdquant.DITHER_MODES:
+            return jsonify({'status': 'error', 'message': f'Unbekanntes Dithering: {dither}'})
+        playlist_mode = data.get('playlist_mode', controller.frame.playlist.mode)
+        if playlist_mode not in PLAYLIST_MODES:
+            return jsonify({'status': 'error', 'message': f'Unbekannte Playlist: {playlist_mode}'})
         controller.frame.feed_url = data.get('feed_url', controller.frame.feed_url)
         controller.frame.enable_rotation = data.get('enable_rotation', controller.frame.enable_rotation)
         controller.frame.enable_resize = data.get('enable_resize', controller.frame.enable_resize)
         controller.frame.display_interval = data.get('display_interval', controller.frame.display_interval)
+        controller.frame.dither = dither
+        controller.frame.playlist.mode = playlist_mode
         controller.save_config()
         logging.info("Konfiguration aktualisiert")
         return jsonify({'status': 'success'})
@@ -133,6 +177,14 @@ def control_display():
         logging.error(f"Fehler bei der Display-Steuerung: {e}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/stats')
+def stats():
+    return jsonify({'status': 'success',
+                    'frame_cache': controller.frame.frame_cache.stats(),
+                    'prefetch': controller.frame.prefetcher.stats(),
+                    'feed': controller.frame.feed_client.stats(),
+                    'feed_index': controller.frame.feed_index.stats()})
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -157,7 +209,8 @@ def upload_file():
                 logging.info("RSS Feed fuer Upload gestoppt")
             
             # Bild anzeigen
-            controller.frame.display_image(filepath)
+            if not controller.frame.display_image(filepath):
+                raise RuntimeError('Bild konnte nicht angezeigt werden')
             logging.info(f"Bild {filename} angezeigt")
             
             # Feed nur wieder starten, wenn er vorher lief
@@ -0,0 +1,818 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmarks fuer die Bild- und Display-Pipeline.
+
+Aufruf: python benchmark.py [name ...]   (ohne Namen laufen alle Benchmarks)
+
+Ohne Display: EPD_BACKEND=simulated python benchmark.py spi busy sim
+"""
+import logging
+import re
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from waveshare_epd import epdbuffer
+from waveshare_epd import epdquant
+
+SEVEN_COLOR_PALETTE = (0,0,0,  255,255,255,  255,255,0,  255,0,0,  0,0,0,  0,0,255,  0,255,0)
+FOUR_COLOR_PALETTE = (0,0,0,  255,255,255,  255,255,0,  255,0,0)
+
+# Aufloesungen von Mono- und Schwarz/Weiss/Rot-Panels (epd2in13, epd4in2, epd7in5b_HD, epd13in3b)
+MONO_PANELS = [(122, 250), (400, 300), (880, 528), (960, 680)]
+
+# Aufloesungen der G-Panels (epd1in64g ... epd7in3g)
+FOUR_COLOR_PANELS = [(168, 168), (122, 250), (160, 296), (168, 296), (184, 360),
+                     (168, 400), (512, 368), (792, 272), (800, 480)]
+
+
+def timed(func, *args, repeat=3):
+    """Fuehrt func mehrfach aus und liefert (beste Laufzeit in s, Ergebnis)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def test_image(width, height, seed=0):
+    """Reproduzierbares RGB-Testbild aus Verlauf und Rauschen"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.empty((height, width, 3), dtype=np.float32)
+    pixels[..., 0] = x
+    pixels[..., 1] = y
+    pixels[..., 2] = (x + y) / 2
+    pixels += rng.normal(0, 24, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+
+
+def quantized_image(width, height, palette, rotate=False):
+    pal_image = Image.new("P", (1,1))
+    pal_image.putpalette(palette + (0,0,0) * (256 - len(palette) // 3))
+    if rotate:
+        # Hochformat-Quelle, wie in getbuffer auf Panel-Ausrichtung gedreht
+        image = test_image(height, width).rotate(90, expand=True)
+    else:
+        image = test_image(width, height)
+    return image.quantize(palette=pal_image)
+
+
+def report(name, old, new):
+    print(f"{name:<28} alt {old * 1000:9.1f} ms   neu {new * 1000:9.1f} ms   Faktor {old / new:7.1f}")
+
+
+def legacy_pack_4bpp(image):
+    # Bisherige Schleife aus epd7in3e.getbuffer
+    buf_7color = bytearray(image.tobytes('raw'))
+    buf = [0x00] * int(len(buf_7color) / 2)
+    idx = 0
+    for i in range(0, len(buf_7color), 2):
+        buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
+        idx += 1
+    return buf
+
+
+def bench_pack_4bpp():
+    """4bpp-Packen eines 800x480 Frames (epd7in3e/epd7in3f)"""
+    image = quantized_image(800, 480, SEVEN_COLOR_PALETTE)
+    old, old_buf = timed(legacy_pack_4bpp, image)
+    new, new_buf = timed(epdbuffer.pack_indices, image, 4)
+    assert bytes(old_buf) == new_buf, "4bpp-Puffer weichen ab"
+    report("pack 4bpp 800x480", old, new)
+
+
+def legacy_pack_2bpp(image):
+    # Bisherige Schleife aus epd2in13g.getbuffer, fuer Breiten mit Rest 2
+    # identisch mit der einfachen Schleife der anderen G-Treiber
+    width, height = image.size
+    buf_4color = bytearray(image.tobytes('raw'))
+    if width % 4 == 0:
+        buf = [0x00] * int(width * height / 4)
+        idx = 0
+        for i in range(0, len(buf_4color), 4):
+            buf[idx] = (buf_4color[i] << 6) + (buf_4color[i+1] << 4) + (buf_4color[i+2] << 2) + buf_4color[i+3]
+            idx += 1
+        return buf
+    Width = width // 4 + 1
+    buf = [0x00] * int(Width * height)
+    idx = 0
+    for j in range(0, height):
+        for i in range(0, Width):
+            if i == Width -1:
+                buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4)
+                idx = idx + 2
+            else:
+                buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4) + (buf_4color[idx+2] << 2) + buf_4color[idx+3]
+                idx = idx + 4
+    return buf
+
+
+def bench_pack_2bpp():
+    """2bpp-Packen fuer alle G-Panels, Quer- und Hochformat, mit Bytevergleich"""
+    for width, height in FOUR_COLOR_PANELS:
+        for rotate in (False, True):
+            image = quantized_image(width, height, FOUR_COLOR_PALETTE, rotate)
+            old, old_buf = timed(legacy_pack_2bpp, image)
+            new, new_buf = timed(epdbuffer.pack_indices, image, 2)
+            assert bytes(old_buf) == new_buf, f"2bpp-Puffer weichen ab: {width}x{height}"
+            orientation = "hoch" if rotate else "quer"
+            report(f"pack 2bpp {width}x{height} {orientation}", old, new)
+
+
+def legacy_pack_mono(image, width, height):
+    # Bisherige Schleife aus epd2in13.getbuffer (mit linewidth), fuer durch 8
+    # teilbare Breiten identisch mit epd4in2/epd13in3b
+    linewidth = (width + 7) // 8
+    buf = [0xFF] * (linewidth * height)
+    image_monocolor = image.convert('1')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    if(imwidth == width and imheight == height):
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0:
+                    buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+    elif(imwidth == height and imheight == width):
+        for y in range(imheight):
+            for x in range(imwidth):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0:
+                    buf[int(newx / 8) + newy*linewidth] &= ~(0x80 >> (y % 8))
+    return buf
+
+
+def bench_pack_mono():
+    """1bpp-getbuffer fuer Mono/BWR-Panels, Quer- und Hochformat, mit Bytevergleich"""
+    for width, height in MONO_PANELS:
+        for rotate in (False, True):
+            image = test_image(height, width) if rotate else test_image(width, height)
+            old, old_buf = timed(legacy_pack_mono, image, width, height, repeat=1)
+            new, new_buf = timed(epdbuffer.pack_mono, image, width, height)
+            assert bytes(old_buf) == new_buf, f"1bpp-Puffer weichen ab: {width}x{height}"
+            orientation = "hoch" if rotate else "quer"
+            report(f"pack 1bpp {width}x{height} {orientation}", old, new)
+
+
+def legacy_gray4(image, width, height):
+    # Bisherige getbuffer_4Gray- und display_4Gray-Schleifen aus epd7in5_V2
+    buf = [0xFF] * (int(width / 4) * height)
+    image_monocolor = image.convert('L')
+    pixels = image_monocolor.load()
+    i = 0
+    for y in range(height):
+        for x in range(width):
+            if(pixels[x, y] == 0xC0):
+                pixels[x, y] = 0x80
+            elif (pixels[x, y] == 0x80):
+                pixels[x, y] = 0x40
+            i = i + 1
+            if(i % 4 == 0):
+                buf[int((x + (y * width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
+
+    planes = []
+    for bits in ({0xC0: 0, 0x00: 1, 0x80: 1, 0x40: 0}, {0xC0: 0, 0x00: 1, 0x80: 0, 0x40: 1}):
+        plane = []
+        for i in range(0, int(width * height / 8)):
+            temp3 = 0
+            for j in range(0, 2):
+                temp1 = buf[i*2+j]
+                for k in range(0, 4):
+                    temp3 = (temp3 << 1) | bits[temp1 & 0xC0]
+                    temp1 <<= 2
+            plane.append(temp3)
+        planes.append(plane)
+    return planes
+
+
+def new_gray4(image, width, height):
+    buf = epdbuffer.pack_gray4(image, width, height)
+    return epdbuffer.split_gray4(buf, (1, 0, 1, 0), (1, 1, 0, 0))
+
+
+def bench_gray4():
+    """4-Graustufen: getbuffer_4Gray plus Aufteilen in beide RAM-Ebenen (800x480)"""
+    levels = np.array([0x00, 0x40, 0x80, 0xC0, 0xFF], dtype=np.uint8)
+    indices = np.random.default_rng(0).integers(0, len(levels), (480, 800))
+    image = Image.fromarray(levels[indices], 'L')
+    old, old_planes = timed(legacy_gray4, image, 800, 480, repeat=1)
+    new, new_planes = timed(new_gray4, image, 800, 480)
+    assert [bytes(plane) for plane in old_planes] == list(new_planes), "4-Graustufen-Ebenen weichen ab"
+    report("gray4 800x480", old, new)
+
+
+def bench_clear():
+    """Clear-Puffer fuer epd7in3e (800x480, 4bpp): Liste pro Aufruf gegen gecachte bytes"""
+    size = 800 * 480 // 2
+
+    def peak(func):
+        tracemalloc.start()
+        func()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak_bytes
+
+    old_peak = peak(lambda: [0x11] * size)
+    epdbuffer.fill.cache_clear()
+    new_peak = peak(lambda: epdbuffer.fill(0x11, size))
+    old, _ = timed(lambda: [0x11] * size)
+    new, _ = timed(epdbuffer.fill, 0x11, size)
+    report("clear 800x480", old, new)
+    print(f"{'':<28} Speicher alt {old_peak / 1024:7.0f} KiB   neu {new_peak / 1024:7.0f} KiB")
+
+
+# Treiber mit Bulk-Transfer, Auswahl ueber alle Pufferformate (1bpp, 2bpp, 4bpp, zwei Ebenen)
+SPI_DRIVERS = ['epd2in13bc', 'epd2in7', 'epd2in9bc', 'epd4in2bc', 'epd1in64g',
+               'epd2in13g', 'epd3in0g', 'epd7in3g', 'epd5in83bc', 'epd7in3e']
+
+
+def bench_spi():
+    """SPI-Zeit pro Frame: Byte fuer Byte (send_data) gegen einen Transfer (send_data2)
+
+    Braucht die Display-Hardware, es wird nur in den RAM des Controllers
+    geschrieben, ein Refresh wird nicht ausgeloest.
+    """
+    import importlib
+    from waveshare_epd import epdconfig
+
+    def syscalls():
+        # Nur das simulierte Backend zaehlt mit, auf der Hardware bleibt es bei 0
+        backend = epdconfig.get_implementation()
+        if not isinstance(backend, epdconfig.Simulated):
+            return 0
+        calls = backend.stats()['syscalls']
+        backend.reset_stats()
+        return calls
+
+    if epdconfig.module_init() != 0:
+        print("SPI konnte nicht initialisiert werden")
+        return
+    try:
+        for name in SPI_DRIVERS:
+            epd = importlib.import_module('waveshare_epd.' + name).EPD()
+            frame = bytes(epd.getbuffer(test_image(epd.width, epd.height)))
+
+            syscalls()
+
+            def per_byte():
+                for byte in frame:
+                    epd.send_data(byte)
+
+            old, _ = timed(per_byte, repeat=1)
+            old_calls = syscalls()
+            new, _ = timed(epd.send_data2, frame, repeat=1)
+            new_calls = syscalls()
+            report(f"spi {name} ({len(frame)} B)", old, new)
+            if new_calls:
+                print(f"{'':<28} Syscalls alt {old_calls:9d}   neu {new_calls:9d}")
+    finally:
+        epdconfig.module_exit()
+
+
+def bench_busy():
+    """CPU-Zeit waehrend eines vollen Refreshs von epd7in3e (braucht das Display)
+
+    Die Busy-Phasen warten auf Flanken des BUSY-Pins, die CPU-Zeit sollte
+    daher nur einen Bruchteil der Wandzeit ausmachen. Simuliert mit echter
+    Wartezeit: EPD_BACKEND=simulated EPD_SIM_TIME_SCALE=0.1
+    """
+    from waveshare_epd import epd7in3e
+
+    epd = epd7in3e.EPD()
+    if epd.init() != 0:
+        print("Display konnte nicht initialisiert werden")
+        return
+    try:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        epd.Clear()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        print(f"{'busy epd7in3e Clear':<28} Wandzeit {wall:6.1f} s   CPU {cpu * 1000:7.1f} ms")
+    finally:
+        epd.sleep()
+
+
+def bench_sim():
+    """init, Clear, display und sleep je Treiber auf dem simulierten Backend
+
+    Zeigt SPI-Bytes, Syscalls, GPIO-Wechsel und die simulierte Panelzeit.
+    """
+    import importlib
+    from waveshare_epd import epdconfig
+
+    backend = epdconfig.get_implementation()
+    if not isinstance(backend, epdconfig.Simulated):
+        print("Nur mit EPD_BACKEND=simulated verfuegbar")
+        return
+    for name in SPI_DRIVERS:
+        epd = importlib.import_module('waveshare_epd.' + name).EPD()
+        frame = epd.getbuffer(test_image(epd.width, epd.height))
+        backend.reset_stats()
+        start = time.perf_counter()
+        epd.init()
+        epd.Clear()
+        if name.endswith('bc'):
+            # Schwarz/Weiss-Rot-Panels nehmen zwei Ebenen
+            epd.display(frame, frame)
+        else:
+            epd.display(frame)
+        epd.sleep()
+        elapsed = time.perf_counter() - start
+        stats = backend.stats()
+        print(f"sim {name:<24} {stats['bytes']:8d} B {stats['syscalls']:6d} Syscalls "
+              f"{stats['gpio_toggles']:6d} GPIO   Panel {stats['sim_ms'] / 1000:5.1f} s   "
+              f"Python {elapsed * 1000:7.1f} ms")
+
+
+def bench_import():
+    """Importzeit von epdconfig und epd7in3e, jeweils in einem frischen Interpreter
+
+    Der Import darf weder eine Shell starten noch das Backend (GPIO) anlegen.
+    """
+    import subprocess
+
+    for module in ('waveshare_epd.epdconfig', 'waveshare_epd.epd7in3e'):
+        code = ("import time; start = time.perf_counter(); "
+                f"import {module}; "
+                "elapsed = (time.perf_counter() - start) * 1000; "
+                "from waveshare_epd import epdconfig; "
+                "print(elapsed, epdconfig.implementation is None)")
+        times = []
+        for _ in range(5):
+            out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+            assert out[1] == 'True', f"Backend wurde beim Import von {module} angelegt"
+            times.append(float(out[0]))
+        print(f"import {module.split('.')[-1]:<21} bester {min(times):7.1f} ms   Median {sorted(times)[2]:7.1f} ms")
+
+
+def photo_frame():
+    """EpaperPhotoFrame fuer epd7in3e ohne init(), die Bildaufbereitung braucht kein Display"""
+    from epaper_display import EpaperPhotoFrame
+    from waveshare_epd import epd7in3e
+
+    return EpaperPhotoFrame.offline(epd7in3e.EPD())
+
+
+def bench_decode():
+    """Dekodieren und Skalieren grosser Fotos auf 800x480: volle Aufloesung gegen draft/reduce"""
+    import io
+
+    frame = photo_frame()
+    for fmt, size in (('JPEG', (6000, 4000)), ('JPEG', (4000, 6000)), ('PNG', (4000, 3000))):
+        data = io.BytesIO()
+        test_image(*size).save(data, fmt)
+
+        def full():
+            image = Image.open(io.BytesIO(data.getvalue()))
+            image.load()
+            return frame.resize_image(image)
+
+        def reduced():
+            image = frame.decode_image(Image.open(io.BytesIO(data.getvalue())))
+            return frame.resize_image(image)
+
+        old, old_image = timed(full, repeat=1)
+        new, new_image = timed(reduced, repeat=1)
+        assert old_image.size == new_image.size, "Zielgroesse weicht ab"
+        report(f"decode {fmt} {size[0]}x{size[1]}", old, new)
+
+
+def legacy_resize(frame, image):
+    # Bisheriges resize_image: Drehung des vollen Bildes vor dem Skalieren
+    orig_width, orig_height = image.size
+    is_portrait = orig_height > orig_width
+    display_width = frame.epd.width
+    display_height = frame.epd.height
+    if frame.enable_rotation and is_portrait:
+        image = image.rotate(90, expand=True)
+        orig_width, orig_height = image.size
+    image_ratio = orig_width / orig_height
+    display_ratio = display_width / display_height
+    if display_ratio > image_ratio:
+        height = display_height
+        width = int(height * image_ratio)
+    else:
+        width = display_width
+        height = int(width / image_ratio)
+    image = image.resize((width, height), Image.LANCZOS)
+    new_image = Image.new('RGB', (display_width, display_height), frame.epd.WHITE)
+    new_image.paste(image, ((display_width - width) // 2, (display_height - height) // 2))
+    return new_image
+
+
+def bench_resize():
+    """resize_image fuer Quer- und Hochformat: Drehen vor gegen nach dem Skalieren"""
+    frame = photo_frame()
+    for size in ((3000, 2000), (2000, 3000), (1000, 4000)):
+        image = test_image(*size)
+        old, old_image = timed(legacy_resize, frame, image)
+        new, new_image = timed(frame.resize_image, image)
+        diff = np.abs(np.asarray(old_image, dtype=np.int16) - np.asarray(new_image, dtype=np.int16)).max()
+        assert diff <= 2, f"Bilder weichen ab: {size}"
+        report(f"resize {size[0]}x{size[1]}", old, new)
+
+
+def legacy_quantize(image):
+    # Bisheriger Weg aus epd7in3e.getbuffer: Palettenbild pro Frame, PIL-Quantisierung
+    pal_image = Image.new("P", (1,1))
+    pal_image.putpalette(SEVEN_COLOR_PALETTE + (0,0,0)*249)
+    return epdbuffer.image_indices(image.convert("RGB").quantize(palette=pal_image))
+
+
+def bench_quant():
+    """Quantisierung eines epd7in3e-Frames (800x480, 7 Farben) mit der 3D-LUT"""
+    import tempfile
+
+    palette = tuple(tuple(SEVEN_COLOR_PALETTE[i:i + 3]) for i in range(0, len(SEVEN_COLOR_PALETTE), 3))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        build, _ = timed(epdquant.Quantizer, palette, epdquant.LUT_BITS, cache_dir, repeat=1)
+        load, quantizer = timed(epdquant.Quantizer, palette, epdquant.LUT_BITS, cache_dir)
+    print(f"{'lut 7 Farben':<28} aufbauen {build * 1000:7.1f} ms   aus Cache {load * 1000:7.1f} ms")
+
+    image = test_image(800, 480)
+    old, old_indices = timed(legacy_quantize, image)
+    new, new_indices = timed(quantizer.quantize, image, epdquant.DITHER_DIFFUSION)
+    assert (old_indices == new_indices).all(), "Floyd-Steinberg weicht ab"
+    report("quant diffusion 800x480", old, new)
+
+    new, new_indices = timed(quantizer.quantize, image, epdquant.DITHER_NONE)
+    report("quant nearest 800x480", old, new)
+
+    # Exakt naechste Farbe je Pixel als Referenz fuer die Rasterung der LUT
+    pixels = np.asarray(image, dtype=np.float32)[..., None, :]
+    exact = ((pixels - np.asarray(palette, dtype=np.float32)) ** 2).sum(axis=-1).argmin(axis=-1)
+    print(f"{'':<28} Abweichung zur exakten Farbe {(exact != new_indices).mean() * 100:.2f} % der Pixel")
+
+
+def dither_images():
+    """Feste Bildauswahl fuer den Dithering-Vergleich (800x480)"""
+    x = np.linspace(0, 1, 800, dtype=np.float32)
+    y = np.linspace(0, 1, 480, dtype=np.float32)[:, None]
+    # Grauverlauf und Farbverlauf ohne Rauschen, dazu das Rauschbild
+    gray = np.repeat(np.broadcast_to(x * 255, (480, 800))[..., None], 3, axis=2)
+    hue = np.stack([255 * x + 0 * y, 255 * y + 0 * x, 255 * (1 - x) * (1 - y)], axis=2)
+    return {
+        'grau': Image.fromarray(gray.astype(np.uint8), 'RGB'),
+        'farbe': Image.fromarray(np.clip(hue, 0, 255).astype(np.uint8), 'RGB'),
+        'rauschen': test_image(800, 480),
+    }
+
+
+def dither_error(image, indices, palette):
+    """Mittlere Abweichung nach Weichzeichnen (Radius 2 px), grob wie aus Betrachtungsabstand"""
+    from PIL import ImageFilter
+
+    rendered = Image.fromarray(np.asarray(palette, dtype=np.uint8)[indices], 'RGB')
+    blur = ImageFilter.GaussianBlur(2)
+    original = np.asarray(image.filter(blur), dtype=np.float32)
+    return np.abs(np.asarray(rendered.filter(blur), dtype=np.float32) - original).mean()
+
+
+def bench_dither():
+    """Zeit und Abweichung je Dithering-Modus, 7 Farben (epd7in3e) und 4 Farben (G-Panels)"""
+    for name, palette_values in (('7 Farben', SEVEN_COLOR_PALETTE), ('4 Farben', FOUR_COLOR_PALETTE)):
+        palette = tuple(tuple(palette_values[i:i + 3]) for i in range(0, len(palette_values), 3))
+        quantizer = epdquant.get_quantizer(palette)
+        for mode in epdquant.DITHER_MODES:
+            quantizer.quantize(Image.new('RGB', (8, 8)), mode)    # Masken laden
+            line = f"dither {name} {mode:<16}"
+            for image_name, image in dither_images().items():
+                elapsed, indices = timed(quantizer.quantize, image, mode)
+                line += f"  {image_name} {elapsed * 1000:5.1f} ms / {dither_error(image, indices, palette):5.1f}"
+            print(line)
+
+
+def bench_parallel():
+    """quantize_pack fuer epd7in3e seriell gegen den Prozess-Pool (EPD_QUANT_WORKERS, sonst 4 Bands)"""
+    import os
+
+    workers = int(os.environ.get('EPD_QUANT_WORKERS', 0)) or 4
+    palette = tuple(tuple(SEVEN_COLOR_PALETTE[i:i + 3]) for i in range(0, len(SEVEN_COLOR_PALETTE), 3))
+    image = test_image(800, 480)
+
+    def unpack(buf):
+        packed = np.frombuffer(buf, dtype=np.uint8)
+        return np.stack([packed >> 4, packed & 0x0F], axis=1).reshape(480, 800)
+
+    print(f"{'':<28} {os.cpu_count()} CPU-Kerne, {workers} Worker")
+    for mode in epdquant.DITHER_MODES:
+        epdquant.set_workers(0)
+        old, old_buf = timed(epdquant.quantize_pack, image, palette, mode, 4)
+        epdquant.set_workers(workers)
+        epdquant.quantize_pack(image, palette, mode, 4)    # Pool starten
+        new, new_buf = timed(epdquant.quantize_pack, image, palette, mode, 4)
+        report(f"parallel {mode}", old, new)
+        if mode == epdquant.DITHER_DIFFUSION:
+            # Fehlerdiffusion startet an jeder Bandgrenze neu, Bytes weichen daher ab
+            print(f"{'':<28} Abweichung seriell {dither_error(image, unpack(old_buf), palette):5.2f}"
+                  f"   parallel {dither_error(image, unpack(new_buf), palette):5.2f}")
+        else:
+            assert old_buf == new_buf, f"Parallele Puffer weichen ab: {mode}"
+    epdquant.set_workers(0)
+
+
+def bench_cache():
+    """Puffer fuer ein 4000x3000-JPEG: Bildaufbereitung plus getbuffer gegen Treffer im Frame-Cache
+
+    Mit EPD_BACKEND=simulated zusaetzlich die Heap-Spitze eines Treffers bis spi_writebyte2.
+    """
+    import io
+    import os
+    import tempfile
+    from frame_cache import FrameCache, source_hash
+    from waveshare_epd import epdconfig
+
+    simulated = os.environ.get('EPD_BACKEND', '').lower() in ('sim', 'simulated')
+    frame = photo_frame()
+    data = io.BytesIO()
+    test_image(4000, 3000).save(data, 'JPEG')
+    data = data.getvalue()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FrameCache(directory)
+        key = cache.make_key(source_hash(data).hexdigest(), frame.render_settings())
+
+        def miss():
+            buffer = frame.render_buffer(Image.open(io.BytesIO(data)))
+            cache.put(key, buffer)
+            return buffer
+
+        def hit():
+            buffer = cache.get(key)
+            if simulated:
+                epdconfig.spi_writebyte2(buffer)
+            buffer.close()
+
+        def hit_read():
+            # Vorheriger Stand: Datei komplett in ein bytes-Objekt lesen
+            with open(cache.path(key), 'rb') as f:
+                epdconfig.spi_writebyte2(f.read())
+
+        old, old_buf = timed(miss, repeat=1)
+        buffer = cache.get(key)
+        assert buffer[:] == old_buf, "Puffer aus dem Cache weicht ab"
+        buffer.close()
+        report("cache 4000x3000", old, timed(hit)[0])
+        print(f"{'':<28} {cache.stats()}")
+
+        if simulated:
+            for name, func in (('read', hit_read), ('mmap', hit)):
+                tracemalloc.start()
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"cache Treffer {name:<14} Heap-Spitze {peak / 1024:7.1f} KB")
+
+
+def bench_download():
+    """Download eines 6000x4000-JPEGs von einem lokalen HTTP-Server: Heap-Spitze response.content gegen Streaming"""
+    import http.server
+    import io
+    import threading
+    import requests
+    from epaper_display import download_image_file
+
+    data = io.BytesIO()
+    test_image(6000, 4000).save(data, 'JPEG', quality=98)
+    data = data.getvalue()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/photo.jpg"
+
+    def legacy():
+        response = requests.get(url, timeout=30)
+        image = Image.open(io.BytesIO(response.content))
+        return image.size
+
+    def streamed():
+        source, _, _ = download_image_file(requests, url)
+        with source:
+            return Image.open(source).size
+
+    results = {}
+    for name, func in (('alt', legacy), ('neu', streamed)):
+        tracemalloc.start()
+        elapsed, size = timed(func, repeat=1)
+        results[name] = (elapsed, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert size == (6000, 4000)
+    server.shutdown()
+    report(f"download {len(data) / 1024 / 1024:.1f} MB", results['alt'][0], results['neu'][0])
+    print(f"{'':<28} Heap-Spitze alt {results['alt'][1] / 1024 / 1024:6.1f} MB   "
+          f"neu {results['neu'][1] / 1024 / 1024:6.1f} MB")
+
+
+def legacy_clean_xml(xml_string):
+    """clean_xml vor der Zusammenfassung der Durchlaeufe"""
+    # Entferne alle Zeichen ausserhalb des gueltigen XML-Bereichs
+    cleaned = ''.join(char for char in xml_string if ord(char) < 0xD800 or ord(char) > 0xDFFF)
+    # Entferne bestimmte Steuerzeichen
+    cleaned = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', cleaned)
+
+    # Ersetze Zeilenumbrüche in description Tags durch Leerzeichen
+    def clean_description(match):
+        content = match.group(1)
+        # Ersetze Zeilenumbrüche durch Leerzeichen
+        content = re.sub(r'\s+', ' ', content)
+        # Stelle sicher, dass & in URLs korrekt escaped sind
+        content = content.replace('&', '&amp;')
+        # Stelle die ursprünglichen HTML entities wieder her
+        content = content.replace('&amp;lt;', '&lt;').replace('&amp;gt;', '&gt;')
+        return f'<description>{content}</description>'
+
+    cleaned = re.sub(r'<description>(.*?)</description>', clean_description, cleaned, flags=re.DOTALL)
+
+    # URLs in <link> Tags finden und & durch &amp; ersetzen
+    def fix_url(match):
+        url = match.group(1)
+        fixed_url = url.replace('&', '&amp;')
+        return f'<link>{fixed_url}</link>'
+
+    cleaned = re.sub(r'<link>(.*?)</link>', fix_url, cleaned)
+
+    # URLs in <guid> Tags finden und & durch &amp; ersetzen
+    def fix_guid(match):
+        is_permalink = match.group(1)
+        url = match.group(2)
+        fixed_url = url.replace('&', '&amp;')
+        return f'<guid isPermaLink="{is_permalink}">{fixed_url}</guid>'
+
+    cleaned = re.sub(r'<guid isPermaLink="(.*?)">(.*?)</guid>', fix_guid, cleaned)
+    return cleaned
+
+
+def synthetic_feed(items, seed=0):
+    """Feed im Format von Synology Photos: unescapte & in link/guid, escaptes XML in description"""
+    rng = np.random.default_rng(seed)
+    base = "https://nas.local:5001/webapi/entry.cgi?api=SYNO.FotoTeam.Download&method=download&version=2"
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0">\n<channel>\n<title>Fotos</title>\n']
+    for i in range(items):
+        url = f"{base}&item_id=%5B{i}%5D&passphrase=k{int(rng.integers(1 << 30))}&type=unit&size=xl"
+        caption = rng.choice(["Urlaub am See", "Geburtstag\u00a0Oma", "Berge &amp; Taeler", "Schnee\x0b im Maerz"])
+        parts.append(
+            f"<item>\n  <title>IMG_{i:05d}.jpg</title>\n  <link>{url}</link>\n"
+            f'  <guid isPermaLink="false">{url}&guid={i}</guid>\n'
+            f"  <description>&lt;item&gt;\n    &lt;url&gt;{url.replace('&', '&amp;')}&lt;/url&gt;\n"
+            f"    &lt;caption&gt;{caption}&lt;/caption&gt;\n  &lt;/item&gt;</description>\n"
+            f"  <pubDate>Sat, 17 Oct 2026 12:{i % 60:02d}:00 +0200</pubDate>\n</item>\n")
+    parts.append('</channel>\n</rss>\n')
+    return ''.join(parts)
+
+
+def bench_feed():
+    """clean_xml synthetischer Synology-Feeds mit 1k/10k Eintraegen, ab den Bytes der Antwort"""
+    import xml.etree.ElementTree as ET
+    from epaper_display import clean_xml
+
+    for items in (1000, 10000):
+        body = synthetic_feed(items).encode('utf-8')
+        old, old_xml = timed(lambda: legacy_clean_xml(body.decode('utf-8', errors='replace')))
+        new, new_xml = timed(clean_xml, body)
+        assert old_xml == new_xml, "Bereinigter Feed weicht ab"
+        assert clean_xml(body.decode('utf-8')) == old_xml, "Bereinigter Feed (str) weicht ab"
+        assert ET.tostring(ET.fromstring(old_xml)) == ET.tostring(ET.fromstring(new_xml))
+        report(f"clean_xml {items} Items", old, new)
+
+
+def bench_feedparse():
+    """Bild-URLs aus 1k/10k-Item-Feeds: ganzer Baum mit allen Items gegen iterparse bis zum dritten"""
+    import itertools
+    import xml.etree.ElementTree as ET
+    from epaper_display import EpaperPhotoFrame, SynologyImageHandler, clean_xml
+
+    frame = EpaperPhotoFrame.offline(None)
+    frame.synology_handler = SynologyImageHandler()
+    logging_level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def legacy(content):
+        root = ET.fromstring(content)
+        return [frame.item_image_url(item) for item in root.findall('.//item')]
+
+    def streamed(content):
+        return [url for _, url in itertools.islice(frame.iter_feed_items(content), 3)]
+
+    for items in (1000, 10000):
+        content = clean_xml(synthetic_feed(items).encode('utf-8'))
+        results = {}
+        for name, func in (('alt', legacy), ('neu', streamed)):
+            elapsed, urls = timed(func, content)
+            tracemalloc.start()
+            func(content)
+            results[name] = (elapsed, tracemalloc.get_traced_memory()[1], urls)
+            tracemalloc.stop()
+        assert results['alt'][2][:3] == results['neu'][2], "URLs weichen ab"
+        assert [url for _, url in frame.iter_feed_items(content)] == results['alt'][2], "URLs weichen ab"
+        report(f"feed parse {items} Items", results['alt'][0], results['neu'][0])
+        print(f"{'':<28} Heap-Spitze alt {results['alt'][1] / 1024 / 1024:6.1f} MB   "
+              f"neu {results['neu'][1] / 1024 / 1024:6.1f} MB")
+    logging.getLogger().setLevel(logging_level)
+
+
+def bench_playlist():
+    """Naechstes Bild aus 100k Items: gemischte Liste im Speicher gegen Playlist ueber den Feed-Index"""
+    import os
+    import random
+    import tempfile
+    from feed_index import FeedIndex
+    from playlist import Playlist, PLAYLIST_MODES
+
+    items = 100000
+    picks = 50
+    logging_level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        index = FeedIndex(os.path.join(directory, 'feed_index.db'))
+        start = time.perf_counter()
+        index.update((f"item-{i}", f"http://nas/photo/{i}.jpg") for i in range(items))
+        print(f"playlist Index {items} Items     {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        def legacy():
+            # Shuffle-Bag als Liste aller Items des Feeds
+            bag = [(row['key'], row['url']) for row in index.db.execute(
+                'SELECT key, url FROM items WHERE position IS NOT NULL')]
+            random.shuffle(bag)
+            return bag[:3]
+
+        old = timed(legacy)[0]
+        tracemalloc.start()
+        legacy()
+        old_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        for mode in PLAYLIST_MODES[1:]:
+            playlist = Playlist(index, mode)
+
+            def pick():
+                upcoming = playlist.upcoming(3)
+                playlist.displayed(upcoming[0])
+                return upcoming
+
+            pick()
+            start = time.perf_counter()
+            for _ in range(picks):
+                pick()
+            new = (time.perf_counter() - start) / picks
+            tracemalloc.start()
+            pick()
+            new_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report(f"playlist {mode}", old, new)
+            print(f"{'':<28} Heap-Spitze alt {old_peak / 1024:9.1f} KB   neu {new_peak / 1024:9.1f} KB")
+        # Einmal pro Shuffle-Durchgang, also alle 100k Anzeigen
+        print(f"playlist neu mischen         {timed(index.reshuffle, repeat=1)[0] * 1000:9.1f} ms")
+        index.db.close()
+    logging.getLogger().setLevel(logging_level)
+
+
+BENCHMARKS = {
+    'pack4': bench_pack_4bpp,
+    'pack2': bench_pack_2bpp,
+    'pack1': bench_pack_mono,
+    'gray4': bench_gray4,
+    'clear': bench_clear,
+    'spi': bench_spi,
+    'busy': bench_busy,
+    'sim': bench_sim,
+    'import': bench_import,
+    'decode': bench_decode,
+    'resize': bench_resize,
+    'quant': bench_quant,
+    'dither': bench_dither,
+    'parallel': bench_parallel,
+    'cache': bench_cache,
+    'download': bench_download,
+    'feed': bench_feed,
+    'feedparse': bench_feedparse,
+    'playlist': bench_playlist,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unbekannter Benchmark: {name} (verfuegbar: {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        BENCHMARKS[name]()
@@ -4,8 +4,8 @@ import sys
 import os
 import requests
 import xml.etree.ElementTree as ET
-from io import BytesIO
 import logging
+import mmap
 import time
 from PIL import Image
 import traceback
@@ -13,6 +13,7 @@ import threading
 from urllib.parse import urlparse, parse_qs
 import urllib3
 import re
+import tempfile
 
 # Logging-Konfiguration
 logging.basicConfig(
@@ -33,45 +34,95 @@ libdir = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__)
 if os.path.exists(libdir):
     sys.path.append(libdir)
 
-from waveshare_epd import epd7in3e
+from waveshare_epd import epd7in3e, epdconfig, epdquant
+from feed_client import FeedClient
+from feed_index import FeedIndex
+from frame_cache import FrameCache, source_hash
+from playlist import Playlist
+from prefetch import Prefetcher
+
+# Bilder ueber dieser Groesse werden nicht geladen (Header oder spaetestens beim Empfang)
+MAX_IMAGE_BYTES = 32 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Blockgroesse, in der der bereinigte Feed an den XML-Parser geht
+FEED_CHUNK_SIZE = 64 * 1024
+
+def download_image_file(session, url, timeout=30, headers=None, require_image=False, max_bytes=MAX_IMAGE_BYTES):
+    """Laedt ein Bild blockweise in eine temporaere Datei
+
+    Der Body liegt nie komplett im Speicher; PIL liest spaeter direkt aus der
+    Datei. Zu grosse oder (mit require_image) falsche Antworten werden schon
+    anhand der Header abgelehnt. Liefert (Datei, Response, Hash der Bytes).
+    """
+    response = session.get(url, headers=headers, timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+        content_type = response.headers.get('content-type', '')
+        if require_image and not content_type.startswith('image/'):
+            raise ValueError(f"Unerwarteter Content-Type: {content_type}")
+        length = response.headers.get('content-length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"Bild zu gross: {int(length)} Bytes (Maximum {max_bytes})")
+
+        file = tempfile.TemporaryFile()
+        try:
+            digest = source_hash()
+            size = 0
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"Bild zu gross: mehr als {max_bytes} Bytes")
+                digest.update(chunk)
+                file.write(chunk)
+            file.seek(0)
+        except Exception:
+            file.close()
+            raise
+        logging.info(f"Download {size / 1024:.0f} KB")
+        return file, response, digest.hexdigest()
+    finally:
+        response.close()
+
+# Zeichen ausserhalb des gueltigen XML-Bereichs: Steuerzeichen und Surrogate
+XML_INVALID_CHARS = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F\ud800-\udfff]+')
+# Dieselben Steuerzeichen als Bytes; in UTF-8 sind sie nie Teil eines Mehrbyte-Zeichens
+XML_INVALID_BYTES = bytes([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F])
+# description-, link- und guid-Elemente in einem Durchlauf. Die Inhalte entsprechen
+# (?s:.*?) bzw. .*? bis zum schliessenden Tag, laufen aber ohne Zeichen-fuer-Zeichen-Backtracking
+FEED_ELEMENTS = re.compile(r'<description>([^<]*(?:<(?!/description>)[^<]*)*)</description>'
+                           r'|<link>([^<\n]*(?:<(?!/link>)[^<\n]*)*)</link>'
+                           r'|<guid isPermaLink="(.*?)">([^<\n]*(?:<(?!/guid>)[^<\n]*)*)</guid>')
+WHITESPACE = re.compile(r'\s+')
+
+def _fix_feed_element(match):
+    description, link, is_permalink, guid = match.groups()
+    if link is not None:
+        # URLs in <link> Tags: & durch &amp; ersetzen
+        return f'<link>{link.replace("&", "&amp;")}</link>'
+    if guid is not None:
+        return f'<guid isPermaLink="{is_permalink}">{guid.replace("&", "&amp;")}</guid>'
+    # Zeilenumbrueche durch Leerzeichen ersetzen und & escapen,
+    # die urspruenglichen HTML entities &lt; und &gt; bleiben erhalten
+    content = WHITESPACE.sub(' ', description)
+    content = content.replace('&', '&amp;').replace('&amp;lt;', '&lt;').replace('&amp;gt;', '&gt;')
+    if '<link>' in content or '<guid ' in content:
+        # Unescapte Elemente in der Beschreibung wie frueher nachbehandeln
+        content = FEED_ELEMENTS.sub(_fix_feed_element, content)
+    return f'<description>{content}</description>'
 
 def clean_xml(xml_string):
-    """Bereinigt XML-String und escaped URLs korrekt"""
+    """Bereinigt XML-String und escaped URLs korrekt
+
+    Nimmt den Feed als str oder direkt als UTF-8-Bytes. Ungueltige Zeichen
+    fallen in einem translate- bzw. Regex-Durchlauf weg, description, link
+    und guid werden danach zusammen in einem einzigen Regex-Durchlauf behandelt.
+    """
     try:
-        # Entferne alle Zeichen ausserhalb des gueltigen XML-Bereichs
-        cleaned = ''.join(char for char in xml_string if ord(char) < 0xD800 or ord(char) > 0xDFFF)
-        # Entferne bestimmte Steuerzeichen
-        cleaned = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', cleaned)
-        
-        # Ersetze Zeilenumbrüche in description Tags durch Leerzeichen
-        def clean_description(match):
-            content = match.group(1)
-            # Ersetze Zeilenumbrüche durch Leerzeichen
-            content = re.sub(r'\s+', ' ', content)
-            # Stelle sicher, dass & in URLs korrekt escaped sind
-            content = content.replace('&', '&amp;')
-            # Stelle die ursprünglichen HTML entities wieder her
-            content = content.replace('&amp;lt;', '&lt;').replace('&amp;gt;', '&gt;')
-            return f'<description>{content}</description>'
-            
-        cleaned = re.sub(r'<description>(.*?)</description>', clean_description, cleaned, flags=re.DOTALL)
-        
-        # URLs in <link> Tags finden und & durch &amp; ersetzen
-        def fix_url(match):
-            url = match.group(1)
-            fixed_url = url.replace('&', '&amp;')
-            return f'<link>{fixed_url}</link>'
-            
-        cleaned = re.sub(r'<link>(.*?)</link>', fix_url, cleaned)
-        
-        # URLs in <guid> Tags finden und & durch &amp; ersetzen
-        def fix_guid(match):
-            is_permalink = match.group(1)
-            url = match.group(2)
-            fixed_url = url.replace('&', '&amp;')
-            return f'<guid isPermaLink="{is_permalink}">{fixed_url}</guid>'
-            
-        cleaned = re.sub(r'<guid isPermaLink="(.*?)">(.*?)</guid>', fix_guid, cleaned)
+        if isinstance(xml_string, bytes):
+            cleaned = xml_string.translate(None, XML_INVALID_BYTES).decode('utf-8', errors='replace')
+        else:
+            cleaned = XML_INVALID_CHARS.sub('', xml_string)
+        cleaned = FEED_ELEMENTS.sub(_fix_feed_element, cleaned)
         
         # Debug: Original vs. Cleaned Content
         logging.debug("=== Original Content ===")
@@ -83,6 +134,8 @@ def clean_xml(xml_string):
     except Exception as e:
         logging.error(f"Fehler beim Bereinigen des XML: {e}")
         logging.error(traceback.format_exc())
+        if isinstance(xml_string, bytes):
+            return xml_string.decode('utf-8', errors='replace')
         return xml_string
 
 class SynologyImageHandler:
@@ -145,7 +198,7 @@ class SynologyImageHandler:
         return None
 
     def download_image(self, url, timeout=30):
-        """Laedt ein Bild von der Synology Photos API herunter"""
+        """Laedt ein Bild von der Synology Photos API herunter, liefert (Datei, Hash der Bytes)"""
         try:
             logging.info(f"Versuche Download von Synology URL: {url}")
             
@@ -156,25 +209,16 @@ class SynologyImageHandler:
                 'Connection': 'keep-alive'
             }
             
-            response = self.session.get(url, headers=headers, timeout=timeout)
+            source, response, digest = download_image_file(self.session, url, timeout, headers, require_image=True)
             
             # Debug-Informationen
             logging.info("=== Synology Response Debug ===")
             logging.info(f"Status Code: {response.status_code}")
             logging.info(f"Headers: {dict(response.headers)}")
             logging.info(f"Content Type: {response.headers.get('content-type', 'Not found')}")
-            logging.info(f"Content Length: {len(response.content)}")
-            
-            response.raise_for_status()
-            
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                logging.error(f"Unerwarteter Content-Type: {content_type}")
-                if response.status_code != 200:
-                    logging.error(f"Error Response: {response.text[:500]}")
-                raise ValueError(f"Unerwarteter Content-Type: {content_type}")
+            logging.info(f"Content Length: {response.headers.get('content-length', 'Not found')}")
                 
-            return response.content
+            return source, digest
             
         except Exception as e:
             logging.error(f"Fehler beim Download von Synology: {e}")
@@ -185,68 +229,81 @@ class EpaperPhotoFrame:
     def __init__(self):
         logging.info("Initialisiere E-Paper Photoframe")
         try:
+            # Wiederholungen nach haengendem BUSY-Pin, jeweils mit Reset und Neuinitialisierung
+            self.display_retries = 2
+            # Serialisiert Zugriffe auf SPI/GPIO (Feed-Schleife und Upload)
+            self.display_lock = threading.Lock()
+
             self.epd = epd7in3e.EPD()
             self.epd.init()
-            self.epd.Clear()
+            if not self._with_recovery(self.epd.Clear):
+                raise RuntimeError("Display konnte nicht geloescht werden")
             logging.info("E-Paper Display initialisiert und geloescht")
             
             self.enable_resize = True
             self.enable_rotation = True
+            self.dither = epdquant.DITHER_DEFAULT
             self.display_interval = 30
             self.feed_url = ""
             self.running = False
-            self.last_url = None
             self.synology_handler = SynologyImageHandler()
+            self.feed_client = FeedClient()
+            self.feed_index = FeedIndex()
+            self.playlist = Playlist(self.feed_index)
+            # Hash der Bilddaten der letzten Anzeige (fuer den Feed-Index)
+            self.last_content_hash = None
+            self.frame_cache = FrameCache()
+            self.render_lock = threading.Lock()
+            self.prefetcher = Prefetcher(self)
         except Exception as e:
             logging.error(f"Fehler bei der Initialisierung: {e}")
             raise
     
+    @classmethod
+    def offline(cls, epd, dither=epdquant.DITHER_DEFAULT, enable_rotation=True, enable_resize=True):
+        """Frame nur fuer die Bildaufbereitung, ohne Display-Init (Batch-Rendering, Benchmarks)"""
+        frame = cls.__new__(cls)
+        frame.epd = epd
+        frame.enable_resize = enable_resize
+        frame.enable_rotation = enable_rotation
+        frame.dither = dither
+        return frame
+
     def set_running(self, state):
         """Erlaubt das Setzen des Running-Status von aussen"""
         self.running = state
         logging.info(f"Frame running status: {state}")
     
-    def get_image_urls(self):
+    def read_feed(self, consume):
+        """Ruft den Feed ab und uebergibt seine Items (Schluessel, URL) als Iterator an consume
+
+        Liefert das Ergebnis von consume, None wenn der Feed unveraendert ist
+        und False, wenn er nicht gelesen werden konnte.
+        """
         if not self.feed_url:
             logging.warning("Keine Feed-URL konfiguriert")
-            return []
+            return False
             
         logging.info(f"Rufe Feed ab: {self.feed_url}")
         attempts = 3
         for attempt in range(attempts):
             try:
-                response = requests.get(self.feed_url, timeout=30)
-                logging.info(f"Feed-Status: {response.status_code}")
+                body = self.feed_client.fetch(self.feed_url, timeout=30)
+                if body is None:
+                    # 304 Not Modified: gleicher Feed wie beim letzten Abruf
+                    return None
                 
                 # Debug: Original Feed Content
-                content = response.content.decode('utf-8', errors='replace')
                 logging.debug("=== Original Feed Content ===")
-                logging.debug(content[:1000])
+                logging.debug(body[:1000].decode('utf-8', errors='replace'))
                 
-                # XML bereinigen
-                content = clean_xml(content)
+                # XML bereinigen, direkt auf den Bytes
+                content = clean_xml(body)
                 logging.debug("=== Cleaned Feed Content ===")
                 logging.debug(content[:1000])
                 
                 try:
-                    root = ET.fromstring(content)
-                    
-                    urls = []
-                    for item in root.findall('.//item'):
-                        # Versuche zuerst die Synology-spezifische URL zu extrahieren
-                        url = self.synology_handler.extract_image_url(item)
-                        if url:
-                            urls.append(url)
-                        else:
-                            # Fallback auf den normalen Link
-                            link = item.find('link')
-                            if link is not None and link.text:
-                                urls.append(link.text.replace('&amp;', '&'))
-                    
-                    logging.info(f"Gefundene Bild-URLs: {len(urls)}")
-                    for url in urls:
-                        logging.info(f"URL gefunden: {url}")
-                    return urls
+                    return consume(self.iter_feed_items(content))
                     
                 except ET.ParseError as e:
                     logging.error(f"XML Parse Error: {str(e)}")
@@ -260,57 +317,88 @@ class EpaperPhotoFrame:
                     raise
                     
             except Exception as e:
+                # Ein nicht verarbeiteter Feed darf nicht als unveraendert (304) gelten
+                self.feed_client.invalidate()
                 if attempt < attempts - 1:
                     logging.warning(f"Versuch {attempt + 1} fehlgeschlagen, versuche erneut...")
                     time.sleep(5)
                 else:
                     logging.error(f"Fehler beim Abrufen des Feeds: {e}")
                     logging.error(traceback.format_exc())
-        return []
+        return False
+
+    def iter_feed_items(self, content):
+        """(Schluessel, Bild-URL) der Feed-Items in Feed-Reihenfolge, Schluessel ist die GUID oder die URL
 
-    def display_image(self, image_url, timeout=30):
+        Das XML wird blockweise geparst, jedes Item nach dem Auslesen aus dem
+        Baum entfernt. Hoert der Aufrufer auf zu lesen, wird der Rest des
+        Feeds weder geparst noch seine Beschreibungen ausgewertet.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        parents = []
+        for offset in range(0, len(content), FEED_CHUNK_SIZE):
+            parser.feed(content[offset:offset + FEED_CHUNK_SIZE])
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    parents.append(elem)
+                    continue
+                parents.pop()
+                if elem.tag != 'item':
+                    continue
+                url = self.item_image_url(elem)
+                guid = elem.findtext('guid')
+                if parents:
+                    parents[-1].remove(elem)
+                if url:
+                    yield (guid.strip() if guid and guid.strip() else url), url
+        parser.close()
+
+    def item_image_url(self, item):
+        # Versuche zuerst die Synology-spezifische URL zu extrahieren
+        url = self.synology_handler.extract_image_url(item)
+        if url:
+            return url
+        # Fallback auf den normalen Link
+        link = item.find('link')
+        if link is not None and link.text:
+            return link.text.replace('&amp;', '&')
+        return None
+
+    def display_image(self, image_url, timeout=30, prefetch=None):
+        """Zeigt ein Bild an, die URLs in prefetch werden waehrend des Refreshs vorab gerendert"""
         logging.info(f"Lade Bild: {image_url}")
         try:
-            if os.path.isfile(image_url):
-                image = Image.open(image_url)
-                logging.info("Lokale Datei geladen")
+            buffer = None
+            prefetched = self.prefetcher.take(image_url, self.render_settings())
+            if prefetched is not None:
+                key, digest = prefetched
+                buffer = self.frame_cache.get(key)
+            if buffer is not None:
+                logging.info("Vorab gerenderter Puffer aus dem Cache")
             else:
-                if self.synology_handler.is_synology_photos_url(image_url):
-                    logging.info("Verarbeite Synology Photos URL")
-                    image_data = self.synology_handler.download_image(image_url, timeout)
-                    image = Image.open(BytesIO(image_data))
-                    logging.info("Synology Bild erfolgreich geladen")
-                else:
-                    logging.info("Verwende Standard Download")
-                    response = requests.get(image_url, timeout=timeout)
-                    response.raise_for_status()
-                    image = Image.open(BytesIO(response.content))
-            
-            logging.info(f"Urspruengliche Bildgroesse: {image.size}")
+                key, buffer, digest = self.prepare_image(image_url, timeout)
+            # Erst jetzt vormerken, sonst verfaellt der vorab gerenderte Puffer dieses Bildes
+            if prefetch is not None:
+                self.prefetcher.schedule(prefetch)
             
-            # Wenn PNG mit Transparenz, weissen Hintergrund hinzufuegen
-            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
-                bg = Image.new('RGB', image.size, 'white')
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                bg.paste(image, (0, 0), image)
-                image = bg
-            
-            if self.enable_resize:
-                image = self.resize_image(image)
-                logging.info(f"Angepasste Bildgroesse: {image.size}")
-            
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            display_thread = threading.Thread(target=self._display_buffer, args=(image,))
-            display_thread.start()
-            display_thread.join(timeout=timeout)
-            
-            if display_thread.is_alive():
-                logging.error("Timeout bei der Bildanzeige")
-                return False
+            # Die Busy-Wartezeiten der Treiber sind begrenzt, daher laeuft die
+            # Anzeige im aufrufenden Thread statt in einem abgehaengten Thread
+            try:
+                # Ein Refresh samt Wiederholungen kann den Download-Timeout weit uebersteigen
+                if not self.display_lock.acquire(timeout=self.display_lock_timeout()):
+                    logging.error("Display ist belegt, Bildanzeige abgebrochen")
+                    return False
+                try:
+                    if not self._with_recovery(self.epd.display, buffer):
+                        return False
+                finally:
+                    self.display_lock.release()
+            finally:
+                # Treffer aus dem Frame-Cache sind eingeblendete Dateien
+                if isinstance(buffer, mmap.mmap):
+                    buffer.close()
                 
+            self.last_content_hash = digest
             logging.info("Bild erfolgreich angezeigt")
             return True
             
@@ -319,41 +407,190 @@ class EpaperPhotoFrame:
             logging.error(traceback.format_exc())
             return False
 
-    def _display_buffer(self, image):
-        try:
-            self.epd.display(self.epd.getbuffer(image))
-        except Exception as e:
-            logging.error(f"Fehler beim Anzeigen des Buffers: {e}")
-            logging.error(traceback.format_exc())
+    def prepare_image(self, image_url, timeout=30):
+        """Liefert (Cache-Schluessel, Puffer, Hash der Quelle), gerendert wird nur wenn der Frame-Cache nichts hat"""
+        source, digest = self.open_image_source(image_url, timeout)
+        with source:
+            key = self.frame_cache.make_key(digest, self.render_settings())
+            buffer = self.frame_cache.get(key)
+            if buffer is not None:
+                logging.info("Gerenderter Puffer aus dem Cache")
+                return key, buffer, digest
+            # Prefetch und Anzeige rendern nie gleichzeitig (Speicher, Prozess-Pool)
+            with self.render_lock:
+                if key in self.frame_cache:
+                    buffer = self.frame_cache.get(key)
+                if buffer is None:
+                    buffer = self.render_buffer(Image.open(source))
+                    self.frame_cache.put(key, buffer)
+        return key, buffer, digest
 
-    def resize_image(self, image):
-        orig_width, orig_height = image.size
-        is_portrait = orig_height > orig_width
+    def open_image_source(self, image_url, timeout=30):
+        """Bild als Datei-Objekt aus einer lokalen Datei oder per Download, dazu der Hash der Bytes"""
+        if os.path.isfile(image_url):
+            source = open(image_url, 'rb')
+            digest = source_hash()
+            for chunk in iter(lambda: source.read(DOWNLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            source.seek(0)
+            logging.info("Lokale Datei geladen")
+            return source, digest.hexdigest()
+        if self.synology_handler.is_synology_photos_url(image_url):
+            logging.info("Verarbeite Synology Photos URL")
+            source, digest = self.synology_handler.download_image(image_url, timeout)
+            logging.info("Synology Bild erfolgreich geladen")
+            return source, digest
+        logging.info("Verwende Standard Download")
+        source, _, digest = download_image_file(requests, image_url, timeout)
+        return source, digest
+
+    def render_settings(self):
+        """Alles ausser der Quelle, was den gepackten Puffer beeinflusst (Teil des Cache-Schluessels)"""
+        return (type(self.epd).__module__, self.epd.width, self.epd.height,
+                self.enable_rotation, self.enable_resize, self.dither,
+                tuple(getattr(self.epd, 'palette', ())))
+
+    def render_buffer(self, image):
+        """Bereitet das Bild fuer das Display auf und liefert den gepackten Puffer"""
+        logging.info(f"Urspruengliche Bildgroesse: {image.size}")
         
-        display_width = self.epd.width
-        display_height = self.epd.height
+        if self.enable_resize:
+            image = self.decode_image(image)
         
-        if self.enable_rotation and is_portrait:
-            image = image.rotate(90, expand=True)
-            orig_width, orig_height = image.size
+        # Wenn PNG mit Transparenz, weissen Hintergrund hinzufuegen
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            bg = Image.new('RGB', image.size, 'white')
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            bg.paste(image, (0, 0), image)
+            image = bg
         
-        image_ratio = orig_width / orig_height
-        display_ratio = display_width / display_height
+        if self.enable_resize:
+            image = self.resize_image(image)
+            logging.info(f"Angepasste Bildgroesse: {image.size}")
         
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        self.epd.dither = self.dither
+        start = time.perf_counter()
+        buffer = self.epd.getbuffer(image)
+        logging.info(f"Buffer erzeugt (Dithering {self.dither}) in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return buffer
+
+    def display_lock_timeout(self):
+        """Laengste Belegung des Displays in s: alle Busy-Fristen des Treibers mal Anzahl der Versuche"""
+        deadlines = getattr(self.epd, 'busy_timeout_ms', None)
+        per_attempt = sum(deadlines.values()) if deadlines else epdconfig.BUSY_TIMEOUT_MS
+        return per_attempt / 1000 * (self.display_retries + 1)
+
+    def _with_recovery(self, action, *args):
+        """Fuehrt eine Display-Aktion aus, nach einem BUSY-Timeout mit Reset und neuem Versuch"""
+        attempts = self.display_retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                action(*args)
+                return True
+            except epdconfig.BusyTimeoutError as e:
+                logging.warning(f"Versuch {attempt}/{attempts}: {e}")
+                if attempt < attempts:
+                    self._recover_display()
+            except Exception as e:
+                logging.error(f"Fehler beim Anzeigen des Buffers: {e}")
+                logging.error(traceback.format_exc())
+                return False
+        logging.error("Display reagiert nicht, Bildanzeige aufgegeben")
+        return False
+
+    def _recover_display(self):
+        """Schaltet das Modul aus und initialisiert es neu (init() macht den Reset)"""
+        try:
+            epdconfig.module_exit()
+            self.epd.init()
+            logging.info("Display zurueckgesetzt und neu initialisiert")
+        except Exception as e:
+            logging.error(f"Fehler beim Zuruecksetzen des Displays: {e}")
+
+    def fit_size(self, width, height):
+        """Groesse, auf die ein Bild width x height fuer das Display skaliert wird (vor der Drehung)"""
+        rotate = self.enable_rotation and height > width
+        if rotate:
+            width, height = height, width
+
+        image_ratio = width / height
+        display_ratio = self.epd.width / self.epd.height
         if display_ratio > image_ratio:
-            height = display_height
-            width = int(height * image_ratio)
+            fit_height = self.epd.height
+            fit_width = int(fit_height * image_ratio)
         else:
-            width = display_width
-            height = int(width / image_ratio)
-            
+            fit_width = self.epd.width
+            fit_height = int(fit_width / image_ratio)
+        fit_width, fit_height = max(1, fit_width), max(1, fit_height)
+
+        return (fit_height, fit_width) if rotate else (fit_width, fit_height)
+
+    def decode_image(self, image):
+        """Dekodiert das Bild nur so gross wie fuer das Display noetig
+
+        JPEGs werden per DCT-Skalierung (draft) mit 1/2, 1/4 oder 1/8 der
+        Aufloesung dekodiert, andere Formate nach dem Laden mit reduce()
+        ganzzahlig verkleinert. Beides bleibt mindestens so gross wie die
+        Zielgroesse, die Feinskalierung macht weiterhin resize_image.
+        """
+        start = time.perf_counter()
+        orig_size = image.size
+        target = self.fit_size(*orig_size)
+
+        if image.format == 'JPEG':
+            image.draft('RGB' if image.mode == 'RGB' else None, target)
+        image.load()
+
+        factor = min(image.size[0] // target[0], image.size[1] // target[1])
+        if factor >= 2 and image.mode in ('L', 'LA', 'RGB', 'RGBA', 'CMYK'):
+            image = image.reduce(factor)
+
+        elapsed = time.perf_counter() - start
+        bands = len(image.getbands())
+        full_mb = orig_size[0] * orig_size[1] * bands / 1e6
+        decoded_mb = image.size[0] * image.size[1] * bands / 1e6
+        # Groesse der dekodierten Bitmap; ru_maxrss waere das Maximum seit Prozessstart, nicht fuer dieses Bild
+        logging.info(f"Dekodiert {orig_size} -> {image.size} fuer Ziel {target} in {elapsed * 1000:.0f} ms, "
+                     f"Bitmap {decoded_mb:.1f} MB statt {full_mb:.1f} MB bei voller Aufloesung")
+        return image
+
+    def resize_image(self, image):
+        """Skaliert das Bild auf das Display und dreht Hochformate erst danach
+
+        Die Geometrie wird einmal geplant: Skalierung in der Ausrichtung der
+        Quelle, danach verlustfreies transpose des kleinen Bildes und Einfuegen
+        in eine Flaeche in der nativen Ausrichtung des Panels (width x height),
+        sodass getbuffer nicht noch einmal drehen muss.
+        """
+        orig_width, orig_height = image.size
+        rotate = self.enable_rotation and orig_height > orig_width
+        width, height = self.fit_size(orig_width, orig_height)
+
+        display_width = self.epd.width
+        display_height = self.epd.height
+
+        start = time.perf_counter()
         image = image.resize((width, height), Image.LANCZOS)
-        
-        new_image = Image.new('RGB', (display_width, display_height), self.epd.WHITE)
+        resized = time.perf_counter()
+
+        if rotate:
+            image = image.transpose(Image.Transpose.ROTATE_90)
+            width, height = height, width
+        transposed = time.perf_counter()
+
+        # Schwarz/Weiss-Treiber haben keine Farbkonstanten
+        new_image = Image.new('RGB', (display_width, display_height), getattr(self.epd, 'WHITE', 0xffffff))
         paste_x = (display_width - width) // 2
         paste_y = (display_height - height) // 2
         new_image.paste(image, (paste_x, paste_y))
-        
+        pasted = time.perf_counter()
+
+        logging.info(f"Skalierung {(orig_width, orig_height)} -> {image.size}: resize {(resized - start) * 1000:.0f} ms, "
+                     f"transpose {(transposed - resized) * 1000:.0f} ms, paste {(pasted - transposed) * 1000:.0f} ms")
         return new_image
 
     def run(self):
@@ -363,18 +600,28 @@ class EpaperPhotoFrame:
             return
 
         try:
-            image_urls = self.get_image_urls()
-            
-            if image_urls and len(image_urls) > 0:
-                url = image_urls[0]
-                if url != self.last_url:  # Nur anzeigen wenn es ein neues Bild ist
-                    if self.display_image(url):
-                        logging.info(f"Bild erfolgreich angezeigt: {url}")
-                        self.last_url = url
-                    else:
-                        logging.warning("Fehler beim Anzeigen des Bildes")
-                else:
-                    logging.info("Bild bereits angezeigt, ueberspringe")
+            # Der ganze Feed geht blockweise in den Index, ohne Liste im Speicher
+            count = self.read_feed(self.feed_index.update)
+            if count is False:
+                return
+            if count is None:
+                # Index ist aktuell, die Playlist laeuft trotzdem weiter
+                logging.info("Feed unveraendert")
+
+            upcoming = self.playlist.upcoming(1 + self.prefetcher.depth)
+            if not upcoming:
+                logging.info("Kein Bild faellig, ueberspringe")
+                return
+            item = upcoming[0]
+            url = item['url']
+            # Die folgenden Items der Playlist rendern, waehrend das Panel aktualisiert
+            if self.display_image(url, prefetch=[following['url'] for following in upcoming[1:]]):
+                logging.info(f"Bild erfolgreich angezeigt: {url}")
+                self.playlist.displayed(item, self.last_content_hash)
+            else:
+                logging.warning("Fehler beim Anzeigen des Bildes")
+                # Beim naechsten Abruf nicht mit 304 ueberspringen, sondern den Feed neu lesen
+                self.feed_client.invalidate()
                 
         except Exception as e:
             logging.error(f"Fehler in der Frame-Hauptschleife: {e}")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Abruf des RSS-Feeds ueber eine dauerhafte Session.
+
+Die Verbindung zum Feed-Server bleibt zwischen den Abrufen offen, der Feed
+wird gzip-komprimiert angefordert und mit ETag/Last-Modified bedingt
+abgerufen: ein unveraenderter Feed kostet nur eine 304-Antwort ohne Body.
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FeedClient:
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': 'Mozilla/5.0 PhotoFrame',
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        # Validatoren der letzten vollstaendigen Antwort
+        self.url = None
+        self.etag = None
+        self.last_modified = None
+        self.polls = 0
+        self.not_modified = 0
+        self.total_bytes = 0
+        self.total_wire_bytes = 0
+        self.last_poll = None
+
+    def invalidate(self):
+        """Naechster Abruf laedt den Feed wieder vollstaendig"""
+        with self.lock:
+            self.etag = None
+            self.last_modified = None
+
+    def fetch(self, url, timeout=30):
+        """Body des Feeds als Bytes oder None, wenn er sich seit dem letzten Abruf nicht geaendert hat"""
+        headers = {}
+        with self.lock:
+            if url != self.url:
+                self.url = url
+                self.etag = None
+                self.last_modified = None
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+
+        start = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=timeout, stream=True)
+        try:
+            if response.status_code == 304:
+                content = None
+            else:
+                response.raise_for_status()
+                content = response.content
+            # Bytes auf der Leitung, bei gzip weniger als der entpackte Feed
+            wire_bytes = response.raw.tell()
+        finally:
+            response.close()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            if content is not None:
+                self.etag = response.headers.get('ETag')
+                self.last_modified = response.headers.get('Last-Modified')
+            self.polls += 1
+            self.not_modified += content is None
+            self.total_bytes += len(content or b'')
+            self.total_wire_bytes += wire_bytes
+            self.last_poll = {
+                'status': response.status_code,
+                'bytes': len(content or b''),
+                'wire_bytes': wire_bytes,
+                'ms': round(elapsed_ms, 1),
+                'encoding': response.headers.get('Content-Encoding', 'identity'),
+            }
+        logging.info(f"Feed-Abruf: Status {response.status_code}, {len(content or b'') / 1024:.1f} KB "
+                     f"({wire_bytes / 1024:.1f} KB uebertragen) in {elapsed_ms:.0f} ms")
+        return content
+
+    def stats(self):
+        with self.lock:
+            return {
+                'polls': self.polls,
+                'not_modified': self.not_modified,
+                'bytes': self.total_bytes,
+                'wire_bytes': self.total_wire_bytes,
+                'last_poll': self.last_poll,
+            }
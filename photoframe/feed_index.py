@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Index der Feed-Items auf der SD-Karte (SQLite).
+
+Schluessel ist die GUID des Items, ohne GUID die Bild-URL. Gespeichert
+werden erster Abruf, Position im aktuellen Feed, Anzahl und Zeitpunkt der
+Anzeigen und der Hash der Bilddaten. Items, die aus dem Feed verschwinden,
+behalten ihren Stand (position NULL) und gelten bei ihrer Rueckkehr nicht
+als neu. Die Abfragen "naechstes ungesehenes" und "am laengsten nicht
+gezeigt" laufen ueber Teilindizes, kosten also O(log n). Fuer die
+Playlist traegt jedes Item ausserdem einen zufaelligen Mischschluessel und
+die Markierung, ob es im laufenden Shuffle-Durchgang schon gezeigt wurde.
+"""
+import itertools
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    key             TEXT PRIMARY KEY,
+    url             TEXT NOT NULL,
+    first_seen      REAL NOT NULL,
+    last_seen       REAL NOT NULL,
+    position        INTEGER,
+    display_count   INTEGER NOT NULL DEFAULT 0,
+    last_displayed  REAL,
+    content_hash    TEXT,
+    shuffle_key     INTEGER,
+    played          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_unseen ON items(position)
+    WHERE display_count = 0 AND position IS NOT NULL;
+CREATE INDEX IF NOT EXISTS items_recency ON items(last_displayed)
+    WHERE position IS NOT NULL;
+CREATE INDEX IF NOT EXISTS items_position ON items(position);
+CREATE INDEX IF NOT EXISTS items_last_displayed ON items(last_displayed);
+CREATE INDEX IF NOT EXISTS items_last_seen ON items(last_seen);
+'''
+
+# Spalten, die nach der ersten Version des Index dazugekommen sind
+COLUMNS = (
+    ('shuffle_key', 'INTEGER'),
+    ('played', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+PLAYLIST_SCHEMA = '''
+UPDATE items SET shuffle_key = random() WHERE shuffle_key IS NULL;
+CREATE INDEX IF NOT EXISTS items_bag ON items(shuffle_key)
+    WHERE played = 0 AND position IS NOT NULL;
+'''
+
+# Items pro Transaktion beim Einlesen eines geaenderten Feeds
+BATCH_SIZE = 500
+
+
+class FeedIndex:
+    def __init__(self, path='feed_index.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        # Feed-Thread schreibt, Weboberflaeche liest: eine Verbindung hinter dem Lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        # WAL und synchronous=NORMAL schonen die SD-Karte
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        existing = {row['name'] for row in self.db.execute('PRAGMA table_info(items)')}
+        for name, definition in COLUMNS:
+            if name not in existing:
+                self.db.execute(f'ALTER TABLE items ADD COLUMN {name} {definition}')
+        self.db.executescript(PLAYLIST_SCHEMA)
+        logging.info(f"Feed-Index {path}: {self.count()} Items")
+
+    def update(self, items):
+        """Uebernimmt die Items (Schluessel, URL) eines vollstaendigen Feed-Abrufs in Feed-Reihenfolge
+
+        Liest den Iterator blockweise, der Feed liegt nie komplett als Liste vor.
+        Liefert die Anzahl der Items.
+        """
+        now = time.time()
+        count = 0
+        items = iter(items)
+        with self.lock:
+            while True:
+                batch = [(key, url, now, now, position)
+                         for position, (key, url) in enumerate(itertools.islice(items, BATCH_SIZE), count)]
+                if not batch:
+                    break
+                with self.db:
+                    self.db.executemany(
+                        'INSERT INTO items (key, url, first_seen, last_seen, position, shuffle_key) '
+                        'VALUES (?, ?, ?, ?, ?, random()) '
+                        'ON CONFLICT(key) DO UPDATE SET url = excluded.url, '
+                        'last_seen = excluded.last_seen, position = excluded.position', batch)
+                count += len(batch)
+            with self.db:
+                # Nicht mehr im Feed: Stand behalten, aber aus den Abfragen nehmen
+                self.db.execute('UPDATE items SET position = NULL WHERE last_seen < ? AND position IS NOT NULL',
+                                (now,))
+        return count
+
+    def item(self, key):
+        with self.lock:
+            return self.db.execute('SELECT * FROM items WHERE key = ?', (key,)).fetchone()
+
+    def at_position(self, position):
+        """Item an dieser Stelle des aktuellen Feeds oder None"""
+        with self.lock:
+            return self.db.execute('SELECT * FROM items WHERE position = ?', (position,)).fetchone()
+
+    def after_position(self, position, limit=1):
+        """Items des aktuellen Feeds hinter dieser Stelle in Feed-Reihenfolge"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT * FROM items WHERE position > ? ORDER BY position LIMIT ?', (position, limit)).fetchall()
+
+    def sample(self, limit=1):
+        """Zufaellige Items des aktuellen Feeds (Wiederholungen moeglich), je eine Indexabfrage"""
+        with self.lock:
+            last = self.db.execute('SELECT MAX(position) FROM items').fetchone()[0]
+            if last is None:
+                return []
+            rows = (self.db.execute('SELECT * FROM items WHERE position >= ? ORDER BY position LIMIT 1',
+                                    (random.randint(0, last),)).fetchone() for _ in range(limit))
+            return [row for row in rows if row is not None]
+
+    def shuffled(self, limit=1):
+        """Im laufenden Shuffle-Durchgang noch nicht gezeigte Items in Mischreihenfolge"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT * FROM items WHERE played = 0 AND position IS NOT NULL '
+                'ORDER BY shuffle_key LIMIT ?', (limit,)).fetchall()
+
+    def reshuffle(self):
+        """Neuer Shuffle-Durchgang: alle Items neu mischen und als nicht gezeigt markieren"""
+        with self.lock, self.db:
+            self.db.execute('UPDATE items SET played = 0, shuffle_key = random()')
+
+    def next_unseen(self, limit=1):
+        """Noch nie angezeigte Items des aktuellen Feeds in Feed-Reihenfolge"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT * FROM items WHERE display_count = 0 AND position IS NOT NULL '
+                'ORDER BY position LIMIT ?', (limit,)).fetchall()
+
+    def least_recently_shown(self, limit=1):
+        """Items des aktuellen Feeds, die am laengsten nicht angezeigt wurden, nie gezeigte zuerst"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT * FROM items WHERE position IS NOT NULL '
+                'ORDER BY last_displayed LIMIT ?', (limit,)).fetchall()
+
+    def last_displayed(self):
+        """Das zuletzt angezeigte Item oder None"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT * FROM items WHERE last_displayed IS NOT NULL '
+                'ORDER BY last_displayed DESC LIMIT 1').fetchone()
+
+    def mark_displayed(self, key, content_hash=None):
+        with self.lock, self.db:
+            self.db.execute(
+                'UPDATE items SET display_count = display_count + 1, last_displayed = ?, played = 1, '
+                'content_hash = COALESCE(?, content_hash) WHERE key = ?', (time.time(), content_hash, key))
+
+    def count(self):
+        """Anzahl der Items im aktuellen Feed"""
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM items WHERE position IS NOT NULL').fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT COUNT(*), COUNT(position), SUM(display_count = 0 AND position IS NOT NULL), '
+                'SUM(display_count) FROM items').fetchone()
+        return {'items': row[0], 'in_feed': row[1], 'unseen': row[2] or 0, 'displays': row[3] or 0}
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Cache fertig gepackter Display-Puffer auf der SD-Karte.
+
+Schluessel ist der Hash der Quelldatei zusammen mit allem, was den Puffer
+beeinflusst (Treiber, Aufloesung, Drehung, Skalierung, Dithering, Palette).
+Jeder Eintrag ist eine Datei <schluessel>.bin mit genau den Bytes, die
+epd.display() bekommt, ohne Kopf oder Kodierung. get() blendet die Datei per
+mmap ein, der Treiber reicht sie ueber spi_writebyte2 direkt an spidev weiter,
+ein Treffer legt den Puffer also nicht noch einmal im Python-Heap an.
+Verdraengt wird nach Gesamtgroesse, am laengsten ungenutzte Eintraege zuerst.
+
+Mehrere Prozesse duerfen dasselbe Verzeichnis nutzen (Frame und
+render_batch.py): Dateien anderer Prozesse werden beim ersten Zugriff
+uebernommen, vor dem Verdraengen wird der Stand aus dem Verzeichnis gelesen.
+Die LRU-Reihenfolge steht in den mtimes und gilt damit fuer alle Prozesse.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# Erhoehen, wenn sich die Bildaufbereitung aendert, alte Eintraege passen dann nicht mehr
+CACHE_VERSION = 1
+
+
+def source_hash(data=b''):
+    """Hash ueber die Bytes der Quelle, bei Downloads blockweise mit update() gefuellt"""
+    return hashlib.blake2b(data, digest_size=20)
+
+
+class FrameCache:
+    def __init__(self, directory='frame_cache', max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # Schluessel -> Groesse in Bytes, vorne der am laengsten ungenutzte
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+        logging.info(f"Frame-Cache: {len(self.entries)} Eintraege, {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def _scan(self):
+        """Liest Eintraege und Gesamtgroesse neu aus dem Verzeichnis, sortiert nach mtime"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    # Gerade von einem anderen Prozess verdraengt
+                    continue
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        self.entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self.total_bytes = sum(self.entries.values())
+
+    def _adopt(self, key):
+        """Uebernimmt eine Datei, die ein anderer Prozess abgelegt hat; False wenn es sie nicht gibt"""
+        try:
+            size = os.stat(self.path(key)).st_size
+        except OSError:
+            return False
+        self.entries[key] = size
+        self.total_bytes += size
+        return True
+
+    @staticmethod
+    def make_key(source_digest, settings):
+        """Schluessel aus dem Hash der Quelle (source_hash) und den Render-Einstellungen"""
+        digest = hashlib.blake2b(source_digest.encode(), digest_size=20)
+        digest.update(repr((CACHE_VERSION, settings)).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries or self._adopt(key)
+
+    def get(self, key):
+        """Gepackter Puffer zum Schluessel als schreibgeschuetztes mmap oder None
+
+        Der Aufrufer schliesst das mmap nach der Anzeige. Wird der Eintrag
+        inzwischen verdraengt, bleibt die eingeblendete Datei bis dahin gueltig.
+        """
+        with self.lock:
+            if key not in self.entries and not self._adopt(key):
+                self.misses += 1
+                return None
+            try:
+                with open(self.path(key), 'rb') as f:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(buffer) != self.entries[key]:
+                    buffer.close()
+                    raise OSError(f"Groesse {len(buffer)} statt {self.entries[key]} Bytes")
+                # mtime merkt sich die Reihenfolge ueber einen Neustart hinweg
+                os.utime(self.path(key))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Frame-Cache: Eintrag {key} nicht lesbar: {e}")
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return buffer
+
+    def put(self, key, buffer):
+        """Legt den Puffer ab und verdraengt alte Eintraege bis max_bytes eingehalten ist"""
+        size = len(buffer)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            tmp = self.path(key) + '.tmp'
+            try:
+                with open(tmp, 'wb') as f:
+                    f.write(buffer)
+                os.replace(tmp, self.path(key))
+            except OSError as e:
+                logging.warning(f"Frame-Cache: Eintrag {key} nicht schreibbar: {e}")
+                return
+            # Andere Prozesse koennen Dateien abgelegt oder verdraengt haben,
+            # ein Verzeichnis mit ein paar hundert Eintraegen liest sich in Millisekunden
+            self._scan()
+            while self.total_bytes > self.max_bytes:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self.path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+            }
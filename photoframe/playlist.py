@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Reihenfolge, in der die Feed-Items angezeigt werden.
+
+newest            nur das neueste Item, jedes genau einmal (bisheriges Verhalten)
+sequential        alle Items in Feed-Reihenfolge, am Ende wieder von vorn
+shuffle           zufaellige Reihenfolge, jedes Item einmal pro Durchgang
+weighted-recency  zufaellig, je laenger ein Item nicht gezeigt wurde desto wahrscheinlicher
+
+Der Zustand steht im Feed-Index (letzte Anzeige, Mischschluessel und
+Shuffle-Markierung je Item), im Speicher liegen nur die naechsten paar
+Items. Jede Auswahl besteht aus wenigen Indexabfragen und bleibt auch bei
+100k Items im Millisekundenbereich.
+"""
+import random
+import time
+
+PLAYLIST_NEWEST = 'newest'
+PLAYLIST_SEQUENTIAL = 'sequential'
+PLAYLIST_SHUFFLE = 'shuffle'
+PLAYLIST_WEIGHTED = 'weighted-recency'
+PLAYLIST_MODES = (PLAYLIST_NEWEST, PLAYLIST_SEQUENTIAL, PLAYLIST_SHUFFLE, PLAYLIST_WEIGHTED)
+
+# weighted-recency zieht aus den am laengsten nicht gezeigten plus ebenso vielen zufaelligen Items
+WEIGHTED_CANDIDATES = 32
+# Nie gezeigte Items zaehlen als so lange (Sekunden) nicht gezeigt
+UNSEEN_AGE = 30 * 24 * 3600
+
+
+class Playlist:
+    def __init__(self, index, mode=PLAYLIST_NEWEST):
+        self.index = index
+        self.mode = mode
+        # Bei weighted-recency vorab gezogene Items, damit der Prefetcher sie kennt
+        self.planned = []
+
+    def upcoming(self, count):
+        """Die naechsten count Items, das erste ist als naechstes dran, leer wenn nichts anzuzeigen ist
+
+        Ohne displayed() dazwischen liefert ein weiterer Aufruf dieselbe
+        Reihenfolge. Das zuletzt angezeigte Item kommt nie direkt noch einmal.
+        """
+        last = self.index.last_displayed()
+        last_key = last['key'] if last is not None else None
+        if self.mode != PLAYLIST_WEIGHTED:
+            self.planned = []
+        if self.mode == PLAYLIST_SEQUENTIAL:
+            items = self._sequential(count + 1, last)
+        elif self.mode == PLAYLIST_SHUFFLE:
+            items = self._shuffle(count + 1)
+        elif self.mode == PLAYLIST_WEIGHTED:
+            items = self._weighted(count, last_key)
+        else:
+            newest = self.index.at_position(0)
+            items = [newest] if newest is not None else []
+        return [item for item in items if item['key'] != last_key][:count]
+
+    def displayed(self, item, content_hash=None):
+        """Vermerkt die Anzeige eines Items aus upcoming()"""
+        self.index.mark_displayed(item['key'], content_hash)
+        self.planned = [planned for planned in self.planned if planned['key'] != item['key']]
+
+    def _sequential(self, count, last):
+        position = last['position'] if last is not None and last['position'] is not None else -1
+        items = self.index.after_position(position, count)
+        if len(items) < count:
+            # Am Ende des Feeds von vorn
+            keys = {item['key'] for item in items}
+            items += [item for item in self.index.after_position(-1, count - len(items)) if item['key'] not in keys]
+        return items
+
+    def _shuffle(self, count):
+        items = self.index.shuffled(count)
+        if not items:
+            # Durchgang komplett, alle Items neu mischen
+            self.index.reshuffle()
+            items = self.index.shuffled(count)
+        return items
+
+    def _weighted(self, count, last_key):
+        # Vorgemerkte Items mit dem aktuellen Stand, aus dem Feed verschwundene fallen weg
+        planned = (self.index.item(item['key']) for item in self.planned)
+        self.planned = [item for item in planned if item is not None and item['position'] is not None]
+        while len(self.planned) < count:
+            exclude = {item['key'] for item in self.planned}
+            exclude.add(last_key)
+            item = self._draw(exclude)
+            if item is None:
+                break
+            self.planned.append(item)
+        return list(self.planned)
+
+    def _draw(self, exclude):
+        """Zieht ein Item gewichtet nach der Zeit seit der letzten Anzeige"""
+        candidates = {}
+        for item in self.index.least_recently_shown(WEIGHTED_CANDIDATES) + self.index.sample(WEIGHTED_CANDIDATES):
+            if item['key'] not in exclude:
+                candidates[item['key']] = item
+        if not candidates:
+            return None
+        now = time.time()
+        items = list(candidates.values())
+        weights = [UNSEEN_AGE if item['last_displayed'] is None else max(now - item['last_displayed'], 1)
+                   for item in items]
+        return random.choices(items, weights)[0]
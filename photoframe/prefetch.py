@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Rendert die naechsten Bilder im Hintergrund in den Frame-Cache.
+
+Ein Refresh des 7-Farb-Panels wartet 20-30 s auf den BUSY-Pin, die CPU ist
+dabei frei. Der Prefetcher laedt und rendert in dieser Zeit die naechsten
+Eintraege, beim naechsten Intervall bleiben nur SPI-Transfer und Refresh.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from mmap import mmap
+
+
+class Prefetcher:
+    def __init__(self, frame, depth=2, max_ready_bytes=8 * 1024 * 1024):
+        self.frame = frame
+        # Hoechstens so viele Bilder im Voraus
+        self.depth = depth
+        # Hoechstens so viele Bytes fertiger, noch nicht angezeigter Puffer. Die
+        # liegen im Frame-Cache auf der SD-Karte, das ist keine Grenze fuer den
+        # RAM: den bestimmen Dekodieren und Quantisieren des Bildes in Arbeit
+        self.max_ready_bytes = max_ready_bytes
+        self.prefetched = 0
+        self.used = 0
+        self.condition = threading.Condition()
+        self.wanted = []
+        self.queue = []
+        # URL -> (Cache-Schluessel, Render-Einstellungen, Groesse, Hash der Quelle)
+        self.ready = OrderedDict()
+        self.ready_bytes = 0
+        self.thread = None
+
+    def schedule(self, urls):
+        """Setzt die als naechstes anzuzeigenden URLs, alte Vormerkungen verfallen"""
+        with self.condition:
+            self.wanted = list(urls)[:self.depth]
+            for url in list(self.ready):
+                if url not in self.wanted:
+                    self.ready_bytes -= self.ready.pop(url)[2]
+            self.queue = [url for url in self.wanted if url not in self.ready]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def take(self, url, settings):
+        """(Cache-Schluessel, Hash der Quelle) fuer eine vorgerenderte URL oder None"""
+        with self.condition:
+            entry = self.ready.pop(url, None)
+            if entry is None:
+                return None
+            self.ready_bytes -= entry[2]
+            self.condition.notify()
+            if entry[1] != settings:
+                # Einstellungen haben sich seit dem Rendern geaendert
+                return None
+            self.used += 1
+            return entry[0], entry[3]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.queue or self.ready_bytes >= self.max_ready_bytes:
+                    self.condition.wait()
+                url = self.queue.pop(0)
+            settings = self.frame.render_settings()
+            try:
+                key, buffer, digest = self.frame.prepare_image(url)
+            except Exception as e:
+                logging.warning(f"Vorab-Rendern fehlgeschlagen fuer {url}: {e}")
+                continue
+            size = len(buffer)
+            if isinstance(buffer, mmap):
+                buffer.close()
+            with self.condition:
+                if url in self.wanted and url not in self.ready:
+                    self.ready[url] = (key, settings, size, digest)
+                    self.ready_bytes += size
+                    self.prefetched += 1
+                    logging.info(f"Vorab gerendert: {url}")
+
+    def stats(self):
+        with self.condition:
+            return {
+                'prefetched': self.prefetched,
+                'used': self.used,
+                'ready': len(self.ready),
+                'ready_bytes': self.ready_bytes,
+                'queued': len(self.queue),
+            }
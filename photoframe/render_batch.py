@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""Rendert einen ganzen Ordner offline in den Frame-Cache.
+
+Aufruf: python render_batch.py ORDNER [--driver epd7in3e] [--workers 4] [--previews vorschau]
+
+Laeuft ohne GPIO/SPI, der Treiber wird nur fuer getbuffer() gebraucht.
+Drehung, Skalierung und Dithering kommen aus config.json wie beim Frame,
+damit die Schluessel zu dem passen, was display_image spaeter sucht. Ein
+laufender Frame findet die neuen Eintraege ohne Neustart.
+Mit --previews entsteht zu jedem Bild ein PNG in den Panel-Farben.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from epaper_display import EpaperPhotoFrame
+from frame_cache import FrameCache
+from waveshare_epd import epdbuffer, epdquant
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff')
+
+_frame = None
+
+
+def _init_worker(driver, dither, enable_rotation, enable_resize):
+    global _frame
+    logging.getLogger().setLevel(logging.WARNING)
+    epd = importlib.import_module('waveshare_epd.' + driver).EPD()
+    _frame = EpaperPhotoFrame.offline(epd, dither, enable_rotation, enable_resize)
+
+
+def preview_image(epd, buffer):
+    """Gerenderten Puffer als RGB-Bild in Panel-Ausrichtung, None bei unbekanntem Format"""
+    bits = len(buffer) * 8 // (epd.width * epd.height)
+    palette = getattr(epd, 'palette', None)
+    if bits == 1 and palette is None:
+        palette = ((0, 0, 0), (255, 255, 255))
+    if bits not in (1, 2, 4) or palette is None:
+        return None
+    image = Image.fromarray(epdbuffer.unpack_indices(buffer, bits, epd.width, epd.height), 'P')
+    flat = [value for color in palette for value in color]
+    image.putpalette(flat + [0] * (768 - len(flat)))
+    return image.convert('RGB')
+
+
+def render_file(path, preview_dir):
+    """Rendert eine Datei im Worker, liefert (Pfad, Cache-Schluessel, Puffer)"""
+    source, digest = _frame.open_image_source(path)
+    with source:
+        key = FrameCache.make_key(digest, _frame.render_settings())
+        buffer = _frame.render_buffer(Image.open(source))
+    if preview_dir:
+        preview = preview_image(_frame.epd, buffer)
+        if preview is not None:
+            name = os.path.splitext(os.path.basename(path))[0] + '.png'
+            preview.save(os.path.join(preview_dir, name))
+    return path, key, buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bilder eines Ordners offline in den Frame-Cache rendern")
+    parser.add_argument('folder', help="Ordner mit den Quellbildern")
+    parser.add_argument('--driver', default='epd7in3e', help="Treibermodul aus waveshare_epd")
+    parser.add_argument('--cache', default='frame_cache', help="Verzeichnis des Frame-Caches")
+    parser.add_argument('--cache-mb', type=int, default=64,
+                        help="Groesse des Frame-Caches in MB, hoechstens so gross wie beim Frame")
+    parser.add_argument('--previews', help="Ordner fuer Vorschau-PNGs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Anzahl Prozesse")
+    parser.add_argument('--config', default='config.json', help="Frame-Konfiguration fuer Drehung, Skalierung, Dithering")
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    dither = config.get('dither', epdquant.DITHER_DEFAULT)
+    enable_rotation = config.get('enable_rotation', True)
+    enable_resize = config.get('enable_resize', True)
+
+    paths = sorted(os.path.join(args.folder, name) for name in os.listdir(args.folder)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        print(f"Keine Bilder in {args.folder}")
+        return 1
+    if args.previews:
+        os.makedirs(args.previews, exist_ok=True)
+
+    # Ohne Display nur die Meldungen der Stapelverarbeitung ausgeben
+    logging.getLogger().setLevel(logging.WARNING)
+    cache = FrameCache(args.cache, args.cache_mb * 1024 * 1024)
+    print(f"{len(paths)} Bilder fuer {args.driver} (Dithering {dither}) mit {args.workers} Prozessen")
+
+    rendered = failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker,
+                             initargs=(args.driver, dither, enable_rotation, enable_resize)) as pool:
+        futures = [pool.submit(render_file, path, args.previews) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                _, key, buffer = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Fehler bei {path}: {e}")
+                continue
+            cache.put(key, buffer)
+            rendered += 1
+    elapsed = time.perf_counter() - start
+
+    stats = cache.stats()
+    print(f"{rendered} gerendert, {failed} Fehler in {elapsed:.1f} s: {rendered / elapsed:.2f} Bilder/s")
+    print(f"Frame-Cache {args.cache}: {stats['entries']} Eintraege, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+          f"{stats['evictions']} verdraengt")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 960
 EPD_HEIGHT      = 680
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 GRAY1  = 0xff #white
 GRAY2  = 0xC0
 GRAY3  = 0x80 #gray
@@ -50,6 +59,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         if (epdconfig.module_init() != 0):
             return -1
     
@@ -77,15 +87,12 @@ class EPD:
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
+        epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
 
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-            epdconfig.delay_ms(20)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         epdconfig.delay_ms(20)
         logger.debug("e-Paper busy release")
 
@@ -93,21 +100,21 @@ class EPD:
         self.send_command(0x22) #Display Update Control
         self.send_data(0xF7)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def TurnOnDisplay_Part(self):
         self.send_command(0x22) #Display Update Control
         self.send_data(0xFF)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def init(self):
         # EPD hardware init start
         self.reset()
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x12) #SWRESET
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x0C) 
         self.send_data(0xAE)
@@ -149,87 +156,50 @@ class EPD:
         self.send_command(0x4F) 
         self.send_data(0x00)
         self.send_data(0x00) 
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         # EPD hardware init end
         return 0
 
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(epdbuffer.fill(0xFF, (int(self.width/8) * self.height)))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_data2(epdbuffer.fill(0x00, (int(self.width/8) * self.height)))
 
         self.TurnOnDisplay()
 
     def Clear_Base(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(epdbuffer.fill(0xFF, (int(self.width/8) * self.height)))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_data2(epdbuffer.fill(0x00, (int(self.width/8) * self.height)))
 
         self.TurnOnDisplay()
         self.send_command(0x26)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(epdbuffer.fill(0xFF, (int(self.width/8) * self.height)))
     
     def display(self, blackimage, ryimage):
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 +1
-        Height = self.height
         if (blackimage != None):
             self.send_command(0x24)
             self.send_data2(blackimage)        
         if (ryimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(ryimage)
+            self.send_data2(epdbuffer.invert(ryimage))
 
         self.TurnOnDisplay()
 
     def display_Base(self, blackimage, ryimage):
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 +1
-        Height = self.height
         if (blackimage != None):
             self.send_command(0x24)
             self.send_data2(blackimage)        
         if (ryimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(ryimage)
+            self.send_data2(epdbuffer.invert(ryimage))
 
         self.TurnOnDisplay()
 
@@ -277,18 +247,13 @@ class EPD:
         self.send_data(Ystart & 0xff)
         self.send_data((Ystart>>8) & 0x01)
 
+        partial = epdbuffer.window(Image, Width, Height, Xstart, Ystart, Xend, Yend)
         self.send_command(0x24) 
-        for j in range(Height):
-            for i in range(Width):
-                if((j > Ystart-1) & (j < (Yend + 1)) & (i > Xstart-1) & (i < (Xend + 1))):
-                    self.send_data(Image[i + j * Width])
+        self.send_data2(partial)
         self.TurnOnDisplay_Part()
 
         self.send_command(0x26) 
-        for j in range(Height):
-            for i in range(Width):
-                if((j > Ystart-1) & (j < (Yend + 1)) & (i > Xstart-1) & (i < (Xend + 1))):
-                    self.send_data(Image[i + j * Width])
+        self.send_data2(partial)
 
     def sleep(self):
         self.send_command(0x10) # DEEP_SLEEP
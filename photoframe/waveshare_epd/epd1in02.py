@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 80
 EPD_HEIGHT      = 128
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
     
     #full screen update LUT
 
@@ -109,23 +119,25 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
         self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy =not(busy & 0x01)
-        while(busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy =not(busy & 0x01)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)
         epdconfig.delay_ms(800)
         logger.debug("e-Paper busy release")        
 
     def TurnOnDisplay(self):
         self.send_command(0x12)
         epdconfig.delay_ms(10)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def SetFulltReg(self):
         self.send_command(0x23)
@@ -190,7 +202,7 @@ class EPD:
         self.send_data(0x33)
         self.SetFulltReg()	
         self.send_command(0x04)     		#power on
-        self.ReadBusy()
+        self.ReadBusy('power_on')
         # EPD hardware init end
         return 0
     
@@ -234,31 +246,12 @@ class EPD:
         self.SetPartReg()	
 
         self.send_command(0x04)#Set POWER SAVING	
-        self.ReadBusy()
+        self.ReadBusy('power_on')
         # EPD hardware init end
         return 0
     
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -270,14 +263,10 @@ class EPD:
             Width = self.width // 8 + 1
             
         self.send_command(0x10)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        self.send_data2(epdbuffer.fill(0xff, int(Width * self.height)))
         
         self.send_command(0x13)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(image[i + j * int(Width)])  
+        self.send_data2(image)
         self.TurnOnDisplay()
         
     def Clear(self):
@@ -290,14 +279,10 @@ class EPD:
         Height = self.height
         
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0x00)  
+        self.send_data2(epdbuffer.fill(0x00, int(Width * Height)))
         
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        self.send_data2(epdbuffer.fill(0xff, int(Width * Height)))
         self.TurnOnDisplay()
 
     def DisplayPartial(self, old_Image, Image):
@@ -321,14 +306,10 @@ class EPD:
         Height = self.height
         # send data
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(old_Image[i + j * int(Width)])
+        self.send_data2(old_Image)
 
         self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(Image[i + j * int(Width)])
+        self.send_data2(Image)
 
         # Set partial refresh
         self.TurnOnDisplay()
@@ -337,7 +318,7 @@ class EPD:
         self.send_command(0x50)
         self.send_data(0xf7)
         self.send_command(0x02)
-        self.ReadBusy()
+        self.ReadBusy('power_off')
         self.send_command(0x07)
         self.send_data(0xA5)
         epdconfig.delay_ms(200)
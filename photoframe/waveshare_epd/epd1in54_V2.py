@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
 EPD_HEIGHT      = 200
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         
     # waveform full refresh
     WF_Full_1IN54 = [
@@ -119,23 +129,22 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(20)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
         self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
         self.send_data(0xc7)
         self.send_command(0x20) # MASTER_ACTIVATION
-        self.ReadBusy()
+        self.ReadBusy('refresh')
     
     def TurnOnDisplayPart(self):
         self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
         self.send_data(0xcF)
         self.send_command(0x20) # MASTER_ACTIVATION
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def lut(self, lut):
         self.send_command(0x32) # WRITE_LUT_REGISTER
@@ -185,7 +194,7 @@ class EPD:
         if(isPartial):
             logger.debug("partial refresh")
             self.reset()
-            self.ReadBusy()
+            self.ReadBusy('reset')
             
             self.set_lut(self.WF_PARTIAL_1IN54_0)
             
@@ -207,16 +216,16 @@ class EPD:
             self.send_command(0x22)
             self.send_data(0xc0)
             self.send_command(0x20)
-            self.ReadBusy()
+            self.ReadBusy('refresh')
         
         else:
             logger.debug("full refresh")
             # EPD hardware init start
             self.reset()
             
-            self.ReadBusy()
+            self.ReadBusy('reset')
             self.send_command(0x12) # SWRESET (software reset)
-            self.ReadBusy()
+            self.ReadBusy('reset')
             
             self.send_command(0x01) # DRIVER_OUTPUT_CONTROL
             self.send_data(0xC7) # (EPD_HEIGHT - 1) & 0xFF
@@ -240,7 +249,7 @@ class EPD:
 
             self.SetCursor(0, self.height-1) # Set Cursor
             
-            self.ReadBusy()
+            self.ReadBusy('refresh')
             
             self.set_lut(self.WF_Full_1IN54) # Set lut
         
@@ -251,31 +260,12 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        self.send_data2([color] * self.height * linewidth)
+        self.send_data2(epdbuffer.fill(color, self.height * linewidth))
                 
         self.TurnOnDisplay()
         
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
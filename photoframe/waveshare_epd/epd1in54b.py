@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
 EPD_HEIGHT      = 200
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
     lut_vcom0 = [0x0E, 0x14, 0x01, 0x0A, 0x06, 0x04, 0x0A, 0x0A, 0x0F, 0x03, 0x03, 0x0C, 0x06, 0x0A, 0x00]
     lut_w = [0x0E, 0x14, 0x01, 0x0A, 0x46, 0x04, 0x8A, 0x4A, 0x0F, 0x83, 0x43, 0x0C, 0x86, 0x0A, 0x04]
@@ -74,11 +84,17 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
       
     def set_lut_bw(self):
@@ -126,7 +142,7 @@ class EPD:
         self.send_data(0x07)
         self.send_command(0x04) # POWER_ON
 
-        self.ReadBusy()
+        self.ReadBusy('power_on')
 
         self.send_command(0X00) # PANEL_SETTING
         self.send_data(0xCF)
@@ -146,60 +162,36 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
         # send black data
         if (blackimage != None):
             self.send_command(0x10) # DATA_START_TRANSMISSION_1
-            for i in range(0, int(self.width * self.height / 8)):
-                temp = 0x00
-                for bit in range(0, 4):
-                    if (blackimage[i] & (0x80 >> bit) != 0):
-                        temp |= 0xC0 >> (bit * 2)
-                self.send_data(temp)  
-                temp = 0x00
-                for bit in range(4, 8):
-                    if (blackimage[i] & (0x80 >> bit) != 0):
-                        temp |= 0xC0 >> ((bit - 4) * 2)
-                self.send_data(temp)
+            # the black RAM takes 2 bits per pixel: 1 -> 11, 0 -> 00
+            self.send_data2(epdbuffer.expand_pixels(blackimage, 1, 2, (0x0, 0x3)))
                 
         # send red data        
         if (redimage != None):
             self.send_command(0x13) # DATA_START_TRANSMISSION_2
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(redimage[i])  
+            self.send_data2(redimage)
 
         self.send_command(0x12) # DISPLAY_REFRESH
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def Clear(self):
         self.send_command(0x10) # DATA_START_TRANSMISSION_1
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
-            self.send_data(0xFF)
+        self.send_data2(epdbuffer.fill(0xFF, (int(self.width * self.height / 8) * 2)))
             
         self.send_command(0x13) # DATA_START_TRANSMISSION_2
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_data2(epdbuffer.fill(0xFF, int(self.width * self.height / 8)))
 
         self.send_command(0x12) # DISPLAY_REFRESH
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
@@ -211,7 +203,7 @@ class EPD:
         self.send_data(0x00)
         self.send_data(0x00) 
         self.send_data(0x00) 
-        self.ReadBusy()
+        self.ReadBusy('reset')
         
         self.send_command(0x02) # power off
         
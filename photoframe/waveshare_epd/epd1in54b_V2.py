@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
 EPD_HEIGHT      = 200
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
 
     # Hardware reset
@@ -74,10 +84,9 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -86,9 +95,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         self.send_command(0x01) #Driver output control      
         self.send_data(0xC7)
@@ -119,26 +128,15 @@ class EPD:
         self.send_command(0x4F)   # set RAM y address count to 0X199    
         self.send_data(0xC7)
         self.send_data(0x00)
-        self.ReadBusy()
+        self.ReadBusy('reset')
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
 
@@ -147,8 +145,6 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0x00] * self.height * linewidth
-
         # send black data
         if (blackimage != None):
             self.send_command(0x24) # DATA_START_TRANSMISSION_1
@@ -157,14 +153,12 @@ class EPD:
         # send red data        
         if (redimage != None):
             self.send_command(0x26) # DATA_START_TRANSMISSION_2
-            for i in range(0, int(self.width * self.height / 8)):
-                buf[i] = ~redimage[i]
-            self.send_data2(buf)
+            self.send_data2(epdbuffer.invert(redimage))
 
         self.send_command(0x22) # DISPLAY_REFRESH
         self.send_data(0xF7)
         self.send_command(0x20) # DISPLAY_REFRESH
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def Clear(self):
         if self.width%8 == 0:
@@ -173,15 +167,15 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24) # DATA_START_TRANSMISSION_1
-        self.send_data2([0xff] * int(self.height * linewidth))
+        self.send_data2(epdbuffer.fill(0xff, int(self.height * linewidth)))
             
         self.send_command(0x26) # DATA_START_TRANSMISSION_2
-        self.send_data2([0x00] * int(self.height * linewidth))
+        self.send_data2(epdbuffer.fill(0x00, int(self.height * linewidth)))
 
         self.send_command(0x22) # DISPLAY_REFRESH
         self.send_data(0xF7)
         self.send_command(0x20) # DISPLAY_REFRESH
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
 
     def sleep(self):
@@ -30,11 +30,22 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+
+import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +56,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         
     FULL_UPDATE = 0
     PART_UPDATE = 1
@@ -112,21 +124,20 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+    def ReadBusy(self, phase='reset'):
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
 
     def TurnOnDisplay(self):
         self.send_command(0x22)
         self.send_data(0xC7)
         self.send_command(0x20)        
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def TurnOnDisplayPart(self):
         self.send_command(0x22)
         self.send_data(0x0c)
         self.send_command(0x20)        
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def init(self, update):
         if (epdconfig.module_init() != 0):
@@ -134,9 +145,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
         if(update == self.FULL_UPDATE):
-            self.ReadBusy()
+            self.ReadBusy('reset')
             self.send_command(0x12) # soft reset
-            self.ReadBusy()
+            self.ReadBusy('reset')
 
             self.send_command(0x74) #set analog block control
             self.send_data(0x54)
@@ -189,12 +200,12 @@ class EPD:
             self.send_command(0x4F)   # set RAM y address count to 0X127
             self.send_data(0xF9)
             self.send_data(0x00)
-            self.ReadBusy()
+            self.ReadBusy('reset')
         else:
             self.send_command(0x2C)     #VCOM Voltage
             self.send_data(0x26)
 
-            self.ReadBusy()
+            self.ReadBusy('reset')
 
             self.send_command(0x32)
             for count in range(70):
@@ -212,40 +223,26 @@ class EPD:
             self.send_command(0x22)
             self.send_data(0xC0)
             self.send_command(0x20)
-            self.ReadBusy()
+            self.ReadBusy('refresh')
 
             self.send_command(0x3C) #BorderWavefrom
             self.send_data(0x01)
         return 0
 
     def getbuffer(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-         
-        buf = [0xFF] * (linewidth * self.height)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        
+        white = np.asarray(image_monocolor)
         if(imwidth == self.width and imheight == self.height):
             logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):                    
-                    if pixels[x, y] == 0:
-                        x = imwidth - x
-                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+            # the panel RAM is mirrored and shifted by one column
+            mirrored = np.ones((imheight, imwidth + 1), dtype=bool)
+            mirrored[:, 1:] = white[:, ::-1]
+            return epdbuffer.pack_bits(mirrored)
         elif(imwidth == self.height and imheight == self.width):
             logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        newy = imwidth - newy - 1
-                        buf[int(newx / 8) + newy*linewidth] &= ~(0x80 >> (y % 8))
-        return buf   
+            return epdbuffer.pack_bits(white.T)
+        return b'\xff' * (int((self.width + 7) / 8) * self.height)
         
         
     def display(self, image):
@@ -259,10 +256,7 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0x00] * self.height * linewidth
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                buf[i + j * linewidth] = ~image[i + j * linewidth]
+        buf = epdbuffer.invert(image)
 
         self.send_command(0x24)
         self.send_data2(image)   
@@ -287,10 +281,7 @@ class EPD:
             linewidth = int(self.width/8) + 1
         # logger.debug(linewidth)
         
-        buf = [0x00] * self.height * linewidth
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                buf[i + j * linewidth] = color
+        buf = epdbuffer.fill(color, self.height * linewidth)
 
         self.send_command(0x24)
         self.send_data2(buf)
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         
     lut_partial_update= [
         0x0,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
@@ -135,10 +145,9 @@ class EPD:
     function :Wait until the busy_pin goes LOW
     parameter:
     '''
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     '''
@@ -149,7 +158,7 @@ class EPD:
         self.send_command(0x22) # Display Update Control
         self.send_data(0xC7)
         self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
     
     '''
     function : Turn On Display Part
@@ -159,7 +168,7 @@ class EPD:
         self.send_command(0x22) # Display Update Control
         self.send_data(0x0f)    # fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
     
     '''
     function : Set lut
@@ -170,7 +179,7 @@ class EPD:
         self.send_command(0x32)
         for i in range(0, 153):
             self.send_data(lut[i])
-        self.ReadBusy()
+        self.ReadBusy('reset')
     
     '''
     function : Send lut data and configuration
@@ -235,9 +244,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
+        self.ReadBusy('reset') 
 
         self.send_command(0x01) #Driver output control      
         self.send_data(0xf9)
@@ -260,7 +269,7 @@ class EPD:
         self.send_command(0x18)
         self.send_data(0x80)
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         
         self.SetLut(self.lut_full_update)
         return 0
@@ -281,9 +290,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return epdbuffer.fill(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = img.tobytes('raw')
         return buf
         
     '''
@@ -298,9 +307,7 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
         self.TurnOnDisplay()
     
     '''
@@ -332,7 +339,7 @@ class EPD:
         self.send_command(0x22) 
         self.send_data(0xC0)
         self.send_command(0x20)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
         self.SetWindow(0, 0, self.width - 1, self.height - 1)
         self.SetCursor(0, 0)
@@ -369,7 +376,7 @@ class EPD:
         # logger.debug(linewidth)
         
         self.send_command(0x24)
-        self.send_data2([color] * int(self.height * linewidth))  
+        self.send_data2(epdbuffer.fill(color, int(self.height * linewidth)))  
         self.TurnOnDisplay()
 
     '''
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         
     '''
     function :Hardware reset
@@ -91,10 +101,9 @@ class EPD:
     function :Wait until the busy_pin goes LOW
     parameter:
     '''
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     '''
@@ -105,7 +114,7 @@ class EPD:
         self.send_command(0x22) # Display Update Control
         self.send_data(0xf7)
         self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     '''
     function : Turn On Display Fast
@@ -115,7 +124,7 @@ class EPD:
         self.send_command(0x22) # Display Update Control
         self.send_data(0xC7)    # fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
     
     '''
     function : Turn On Display Part
@@ -125,7 +134,7 @@ class EPD:
         self.send_command(0x22) # Display Update Control
         self.send_data(0xff)    # fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
 
     '''
@@ -173,9 +182,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
+        self.ReadBusy('reset') 
 
         self.send_command(0x01) #Driver output control      
         self.send_data(0xf9)
@@ -198,7 +207,7 @@ class EPD:
         self.send_command(0x18)
         self.send_data(0x80)
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         
         return 0
 
@@ -213,7 +222,7 @@ class EPD:
         self.reset()
 
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
+        self.ReadBusy('reset') 
 
         self.send_command(0x18) # Read built-in temperature sensor
         self.send_command(0x80)
@@ -227,7 +236,7 @@ class EPD:
         self.send_command(0x22) # Load temperature value
         self.send_data(0xB1)	
         self.send_command(0x20)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
         self.send_command(0x1A) # Write to temperature register
         self.send_data(0x64)
@@ -236,7 +245,7 @@ class EPD:
         self.send_command(0x22) # Load temperature value
         self.send_data(0x91)	
         self.send_command(0x20)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
         return 0
     '''
@@ -255,9 +264,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return epdbuffer.fill(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = img.tobytes('raw')
         return buf
         
     '''
@@ -332,7 +341,7 @@ class EPD:
         # logger.debug(linewidth)
         
         self.send_command(0x24)
-        self.send_data2([color] * int(self.height * linewidth))  
+        self.send_data2(epdbuffer.fill(color, int(self.height * linewidth)))  
         self.TurnOnDisplay()
 
     '''
@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 104
 EPD_HEIGHT      = 212
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
     # Hardware reset
     def reset(self):
@@ -65,13 +75,18 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
         self.send_command(0x71);
-        while(epdconfig.digital_read(self.busy_pin) == 0): 
-            self.send_command(0x71);
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
 
     def init(self):
@@ -80,7 +95,7 @@ class EPD:
             
         self.reset()
         self.send_command(0x04);  
-        self.ReadBusy();#waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('power_on');#waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x00);    #panel setting
         self.send_data(0x0f);   #LUT from OTP,128x296
@@ -98,60 +113,35 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(imageblack[i])
+        self.send_data2(imageblack)
         
         self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(imagered[i])
+        self.send_data2(imagered)
         
         self.send_command(0x12) # REFRESH
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def Clear(self):
         self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_data2(epdbuffer.fill(0xFF, int(self.width * self.height / 8)))
         
         self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_data2(epdbuffer.fill(0xFF, int(self.width * self.height / 8)))
         
         self.send_command(0x12) # REFRESH
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0X50) 
         self.send_data(0xf7)
         self.send_command(0X02) 
-        self.ReadBusy()
+        self.ReadBusy('power_off')
         self.send_command(0x07) # DEEP_SLEEP
         self.send_data(0xA5) # check code
         
@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
     # hardware reset
     def reset(self):
@@ -76,10 +86,9 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 1)
         
     # judge e-Paper whether is busy
-    def busy(self):
+    def busy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) != 0): 
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
 
     # set the display window
@@ -110,9 +119,9 @@ class EPD:
             
         self.reset()
 
-        self.busy()
+        self.busy('reset')
         self.send_command(0x12)  # SWRESET
-        self.busy()   
+        self.busy('reset')   
 
         self.send_command(0x01) # Driver output control      
         self.send_data(0xf9)
@@ -135,14 +144,14 @@ class EPD:
         self.send_data(0x80)	
         self.send_data(0x80)
 
-        self.busy()
+        self.busy('reset')
         
         return 0
 
     # turn on display
     def ondisplay(self):
         self.send_command(0x20)
-        self.busy()
+        self.busy('refresh')
 
     # image converted to bytearray
     def getbuffer(self, image):
@@ -156,9 +165,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return epdbuffer.fill(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = img.tobytes('raw')
         return buf
 
     # display image
@@ -178,7 +187,7 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
             
-        buf = [0xff] * (int(linewidth * self.height))
+        buf = epdbuffer.fill(0xff, (int(linewidth * self.height)))
             
         self.send_command(0x24)
         self.send_data2(buf)
@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+from . import epdquant
 
 import PIL
 from PIL import Image
@@ -39,6 +41,17 @@ import io
 EPD_WIDTH       = 160
 EPD_HEIGHT      = 296
 
+# Busy deadlines per phase in ms, a full refresh takes about 20 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
+# Panel colors in index order: BLACK, WHITE, YELLOW, RED
+EPD_PALETTE     = ((0, 0, 0), (255, 255, 255), (255, 255, 0), (255, 0, 0))
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -49,6 +62,9 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
+        self.palette = EPD_PALETTE    # may be replaced by the measured ink colors
+        self.dither = epdquant.DITHER_DEFAULT
         self.BLACK  = 0x000000   #   00  BGR
         self.WHITE  = 0xffffff   #   01
         self.YELLOW = 0x00ffff   #   10
@@ -83,17 +99,16 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy H")
         epdconfig.delay_ms(100)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
         self.send_command(0x12) # DISPLAY_REFRESH
         self.send_data(0X00)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def init(self):
         if (epdconfig.module_init() != 0):
@@ -102,7 +117,7 @@ class EPD:
 
         self.reset()
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x4D)
         self.send_data(0x78)
 
@@ -171,14 +186,10 @@ class EPD:
         self.send_data(0x01)
         
         self.send_command(0x04)
-        self.ReadBusy()
+        self.ReadBusy('power_on')
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  255,255,0,   255,0,0) + (0,0,0)*252)
-
         # Check if we need to rotate the image
         imwidth, imheight = image.size
         if(imwidth == self.width and imheight == self.height):
@@ -188,23 +199,9 @@ class EPD:
         else:
             logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
 
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        if self.width % 4 == 0 :
-            Width = self.width // 4
-        else :
-            Width = self.width // 4 + 1
-        Height = self.height 
-        buf = [0x00] * int(Width * Height)
-        idx = 0
-        for j in range(0, Height):
-            for i in range(0, Width):
-                    buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4) + (buf_4color[idx+2] << 2) + buf_4color[idx+3]
-                    idx = idx + 4
-        return buf
+        # Convert the soruce image to the 4 colors, dithering if needed.
+        # Pack 4 pixels into a single byte to transfer to the panel
+        return epdquant.quantize_pack(image_temp, self.palette, self.dither, 2)
 
     def display(self, image):
         self.send_command(0x10)
@@ -220,9 +217,7 @@ class EPD:
         Height = self.height
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                    self.send_data(color)
+        self.send_data2(epdbuffer.fill(color, (Width * Height)))
         self.TurnOnDisplay()
 
     def sleep(self):
@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
 EPD_HEIGHT      = 296
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
     WF_PARTIAL = [
         0x00,0x40,0x00,0x00,0x00,0x00,0x00,0x00,0x00,0x00,
@@ -96,10 +106,9 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 1)
 
 
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200) 
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
@@ -111,7 +120,7 @@ class EPD:
         
         self.send_command(0x12)
         epdconfig.delay_ms(300)
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x11) # setting gaet number
         self.send_data(0x03)
@@ -149,7 +158,7 @@ class EPD:
             self.send_data(0xcf)
             
             self.send_command(0x20)
-            self.ReadBusy()
+            self.ReadBusy('refresh')
 
         else:
             logger.debug("There is no such mode") 
@@ -165,31 +174,10 @@ class EPD:
 
     def turnon_display(self):
         self.send_command(0x20)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
 
     def display(self, image):
@@ -219,7 +207,7 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0xff] * int(self.height * linewidth)
+        buf = epdbuffer.fill(0xff, int(self.height * linewidth))
 
         self.send_command(0x24)
         self.send_data2(buf)   
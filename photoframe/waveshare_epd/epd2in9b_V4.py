@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 128
 EPD_HEIGHT      = 296
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         
     # Hardware reset
     def reset(self):
@@ -74,11 +84,10 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
         self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)                
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
 
@@ -86,25 +95,25 @@ class EPD:
         self.send_command(0x22) #Display Update Control
         self.send_data(0xF7)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def TurnOnDisplay_Base(self):
         self.send_command(0x22) #Display Update Control
         self.send_data(0xF4)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def TurnOnDisplay_Fast(self):
         self.send_command(0x22) #Display Update Control
         self.send_data(0xC7)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def TurnOnDisplay_Partial(self):
         self.send_command(0x22) #Display Update Control
         self.send_data(0x1C)
         self.send_command(0x20) #Activate Display Update Sequence
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
 
     def init(self):
@@ -114,9 +123,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         self.send_command(0x01) #Driver output control      
         self.send_data((self.height-1)%256)    
@@ -151,7 +160,7 @@ class EPD:
         self.send_command(0x4F)   # set RAM y address count to 0X199    
         self.send_data(0x00)    
         self.send_data(0x00)
-        self.ReadBusy()
+        self.ReadBusy('reset')
         
         return 0
     
@@ -162,9 +171,9 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy()   	
+        self.ReadBusy('reset')   	
 
         self.send_command(0x18) #Read built-in temperature sensor
         self.send_data(0x80)
@@ -172,7 +181,7 @@ class EPD:
         self.send_command(0x22) # Load temperature value
         self.send_data(0xB1)		
         self.send_command(0x20)	
-        self.ReadBusy()   
+        self.ReadBusy('refresh')   
 
         self.send_command(0x1A) # Write to temperature register
         self.send_data(0x5a)		# 90		
@@ -181,7 +190,7 @@ class EPD:
         self.send_command(0x22) # Load temperature value
         self.send_data(0x91)		
         self.send_command(0x20)	
-        self.ReadBusy()  
+        self.ReadBusy('refresh')  
 
         self.send_command(0x01) #Driver output control      
         self.send_data((self.height-1)%256)    
@@ -206,110 +215,62 @@ class EPD:
         self.send_command(0x4F)   # set RAM y address count to 0X199    
         self.send_data(0x00)    
         self.send_data(0x00)
-        self.ReadBusy()	
+        self.ReadBusy('reset')	
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, blackimage, ryimage): # ryimage: red or yellow image
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 +1
-        Height = self.height
         if (blackimage != None):
             self.send_command(0x24)
             self.send_data2(blackimage)        
         if (ryimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(ryimage)
+            self.send_data2(epdbuffer.invert(ryimage))
 
         self.TurnOnDisplay()
 
     def display_Fast(self, blackimage, ryimage): # ryimage: red or yellow image
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 +1
-        Height = self.height
         if (blackimage != None):
             self.send_command(0x24)
             self.send_data2(blackimage)        
         if (ryimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(ryimage)
+            self.send_data2(epdbuffer.invert(ryimage))
 
         self.TurnOnDisplay_Fast()
         
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.width * self.height // 8))
+        self.send_data2(epdbuffer.fill(0xff, int(self.width * self.height // 8)))
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.width * self.height // 8))
+        self.send_data2(epdbuffer.fill(0x00, int(self.width * self.height // 8)))
 
         self.TurnOnDisplay()
 
     def Clear_Fast(self):
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.width * self.height // 8))
+        self.send_data2(epdbuffer.fill(0xff, int(self.width * self.height // 8)))
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.width * self.height // 8))
+        self.send_data2(epdbuffer.fill(0x00, int(self.width * self.height // 8)))
 
         self.TurnOnDisplay_Fast()
 
     def display_Base(self, blackimage, ryimage):
-        if(self.width % 8 == 0):
-            Width = self.width // 8
-        else:
-            Width = self.width // 8 +1
-        Height = self.height
         if (blackimage != None):
             self.send_command(0x24)
             self.send_data2(blackimage)        
         if (ryimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(ryimage)
+            self.send_data2(epdbuffer.invert(ryimage))
 
         self.TurnOnDisplay_Base()
 
         if (blackimage != None):
-            for j in range(Height):
-                for i in range(Width):
-                    blackimage[i + j * Width] = ~blackimage[i + j * Width]
             self.send_command(0x26)
-            self.send_data2(blackimage)
+            self.send_data2(epdbuffer.invert(blackimage))
         else:
             self.send_command(0x26)
             self.send_data2(blackimage)   
@@ -321,20 +282,14 @@ class EPD:
             Width = self.width // 8 +1
         Height = self.height
         self.send_command(0x24)   #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                self.send_data(color)
+        self.send_data2(epdbuffer.fill(color, (Width * Height)))
                 
         self.send_command(0x26)  #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                self.send_data(~color)
+        self.send_data2(epdbuffer.fill(~color & 0xFF, (Width * Height)))
         
         self.TurnOnDisplay_Base()
         self.send_command(0x26)   #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                self.send_data(color) 
+        self.send_data2(epdbuffer.fill(color, (Width * Height)))
 
     def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
         if((Xstart % 8 + Xend % 8 == 8 & Xstart % 8 > Xend % 8) | Xstart % 8 + Xend % 8 == 0 | (Xend - Xstart)%8 == 0):
@@ -372,10 +327,7 @@ class EPD:
         self.send_data((Ystart>>8) & 0x01)
 
         self.send_command(0x24)   #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                if((j > Ystart-1) & (j < (Yend + 1)) & (i > Xstart-1) & (i < (Xend + 1))):
-                    self.send_data(Image[i + j * Width])
+        self.send_data2(epdbuffer.window(Image, Width, Height, Xstart, Ystart, Xend, Yend))
         self.TurnOnDisplay_Partial()
         
     def sleep(self):
@@ -30,11 +30,20 @@
 import logging
 from multiprocessing.reduction import recv_handle
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 240
 EPD_HEIGHT      = 360
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         self.Flag = 0
         self.WHITE = 0xFF
         self.BLACK = 0x00
@@ -222,10 +232,9 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: busy, 1: idle
-            epdconfig.delay_ms(5) 
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)      #  0: busy, 1: idle
         logger.debug("e-Paper busy release")
 
     def lut(self) :
@@ -247,7 +256,7 @@ class EPD:
     def refresh(self):
         self.send_command(0x17)
         self.send_data(0xA5)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         epdconfig.delay_ms(200)
 
     # LUT download
@@ -352,28 +361,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -385,67 +373,69 @@ class EPD:
         # pcnt = 0
 
         self.send_command(0x13);		     #Transfer new data
+        buf = []
         for column in range(0, self.height):
             for row in range(0, self.width//8):
                 if NUM == self.WHITE:
-                    self.send_data(0xFF)
+                    buf.append(0xFF)
                         
                 elif NUM == self.BLACK:
-                    self.send_data(0x00)
+                    buf.append(0x00)
                         
                 elif NUM == self.Source_Line:
-                    self.send_data(0xAA)
+                    buf.append(0xAA)
                         
                 elif NUM == self.Gate_Line:
                     if(column%2):
-                        self.send_data(0xff) # An odd number of Gate line  
+                        buf.append(0xff) # An odd number of Gate line  
                     else:
-                        self.send_data(0x00) # The even line Gate  
+                        buf.append(0x00) # The even line Gate  
                         
                 elif NUM == self.Chessboard:
                     if(row>=(self.width/8/2) and column>=(self.height/2)):
-                        self.send_data(0xff)
+                        buf.append(0xff)
                     elif(row<(self.width/8/2) and column<(self.height/2)):
-                        self.send_data(0xff)									
+                        buf.append(0xff)									
                     else:
-                        self.send_data(0x00)	
+                        buf.append(0x00)	
                         
                 elif NUM == self.LEFT_BLACK_RIGHT_WHITE:
                     if(row>=(self.width/8/2)):
-                        self.send_data(0xff)
+                        buf.append(0xff)
                     else:
-                        self.send_data(0x00)
+                        buf.append(0x00)
                             
                 elif NUM == self.UP_BLACK_DOWN_WHITE:
                     if(column>=(self.height/2)):
-                        self.send_data(0xFF)
+                        buf.append(0xFF)
                     else:
-                        self.send_data(0x00)
+                        buf.append(0x00)
                             
                 elif NUM == self.Frame:
                     if(column==0 or column==(self.height-1)):
-                        self.send_data(0x00)					
+                        buf.append(0x00)					
                     elif(row==0):
-                        self.send_data(0x7F)
+                        buf.append(0x7F)
                     elif(row==(self.width/8-1)):
-                        self.send_data(0xFE);					
+                        buf.append(0xFE);					
                     else:
-                        self.send_data(0xFF);				
+                        buf.append(0xFF);				
                             
                 elif NUM == self.Crosstalk:
                     if((row>=(self.width/8/3) and row<=(self.width/8/3*2) and column<=(self.height/3)) or (row>=(self.width/8/3) and row<=(self.width/8/3*2) and column>=(self.height/3*2))):
-                        self.send_data(0x00)
+                        buf.append(0x00)
                     else:
-                        self.send_data(0xFF)				
+                        buf.append(0xFF)				
                             
                 elif NUM == self.Image:
                     epdconfig.delay_ms(1)
                     # self.send_data(gImage_1[pcnt++])
- 
-        
+        if buf:
+            self.send_data2(buf)
+
     def Clear(self):
         self.send_command(0x13);		     # Transfer new data
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(epdbuffer.fill(0xFF, int(self.width * self.height / 8)))
         self.lut_GC()
         self.refresh()
 
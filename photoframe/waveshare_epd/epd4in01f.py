@@ -31,11 +31,24 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 640
 EPD_HEIGHT      = 400
 
+# Busy deadlines per phase in ms, a full refresh takes about 30 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  60000,
+    'power_off': 2000,
+}
+
+# Panel colors in index order: BLACK, WHITE, GREEN, BLUE, RED, YELLOW, ORANGE
+EPD_PALETTE     = ((0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255),
+                   (255, 0, 0), (255, 255, 0), (255, 128, 0))
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -46,6 +59,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         self.BLACK  = 0x000000   #   0000  BGR
         self.WHITE  = 0xffffff   #   0001
         self.GREEN  = 0x00ff00   #   0010
@@ -83,16 +97,14 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusyHigh(self):
+    def ReadBusyHigh(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
-    def ReadBusyLow(self):
+    def ReadBusyLow(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)    
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -101,7 +113,7 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('reset')
         self.send_command(0x00)
         self.send_data(0x2f)
         self.send_data(0x00)
@@ -134,60 +146,18 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0x00] * int(self.width * self.height / 2)
         image_monocolor = image.convert('RGB')#Picture mode conversion
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
         logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
         if(imwidth == self.width and imheight == self.height):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    Add = int((x + y * self.width) / 2)
-                    Color = 0;
-                    if (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 0
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 255):
-                        Color = 1
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 2
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 255):
-                        Color = 3
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 4
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 5
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 128 and pixels[x, y][2] == 0):
-                        Color = 6
-                    
-                    data_t = buf[Add]&(~(0xF0 >> ((x % 2)*4)))
-                    buf[Add] = data_t | ((Color << 4) >> ((x % 2)*4));
-                        
+            image_temp = image_monocolor
         elif(imwidth == self.height and imheight == self.width):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1   
-                    Add = int((newx + newy*self.width) / 2)
-                    Color = 0;
-                    if (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 0
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 255):
-                        Color = 1
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 2
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 255):
-                        Color = 3
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 4
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 5
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 128 and pixels[x, y][2] == 0):
-                        Color = 6
-                    
-                    data_t = buf[Add]&(~(0xF0 >> ((newx % 2)*4)))
-                    buf[Add] = data_t | ((Color << 4) >> ((newx % 2)*4));
-        return buf
+            image_temp = image_monocolor.rotate(90, expand=True)
+        else:
+            return bytes(int(self.width * self.height / 2))
+
+        indices = epdbuffer.match_colors(image_temp, EPD_PALETTE)
+        return epdbuffer.pack_indices(indices, 4)
 
     def display(self,image):
         self.send_command(0x61)#Set Resolution setting
@@ -198,11 +168,11 @@ class EPD:
         self.send_command(0x10)
         self.send_data2(image)
         self.send_command(0x04)#0x04
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('power_on')
         self.send_command(0x12)#0x12
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('refresh')
         self.send_command(0x02)  #0x02
-        self.ReadBusyLow()
+        self.ReadBusyLow('power_off')
         # epdconfig.delay_ms(500)
         
     def Clear(self):
@@ -212,7 +182,7 @@ class EPD:
         self.send_data(0x01)
         self.send_data(0x90)
         self.send_command(0x10)
-        self.send_data2([0x11] * int(EPD_HEIGHT) * int(EPD_WIDTH/2))
+        self.send_data2(epdbuffer.fill(0x11, int(EPD_HEIGHT) * int(EPD_WIDTH/2)))
         #BLACK   0x00    /// 0000
         #WHITE   0x11    /// 0001
         #GREEN   0x22    /// 0010
@@ -222,11 +192,11 @@ class EPD:
         #ORANGE  0x66    /// 0110
         #CLEAN   0x77    /// 0111   unavailable  Afterimage
         self.send_command(0x04)#0x04
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('power_on')
         self.send_command(0x12)#0x12
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('refresh')
         self.send_command(0x02)  #0x02
-        self.ReadBusyLow()
+        self.ReadBusyLow('power_off')
         # epdconfig.delay_ms(500)
 
     def sleep(self):
@@ -29,11 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 400
 EPD_HEIGHT      = 300
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -44,6 +53,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         self.flag = 0
         
         if (epdconfig.module_init(cleanup=True) != 0):
@@ -78,15 +88,13 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
         if(self.flag == 1):
-            while(epdconfig.digital_read(self.busy_pin) == 1): 
-                epdconfig.delay_ms(100) 
+            epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         
         else:
-            while(epdconfig.digital_read(self.busy_pin) == 0): 
-                epdconfig.delay_ms(100) 
+            epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
@@ -94,12 +102,12 @@ class EPD:
             self.send_command(0x22)
             self.send_data(0xF7)	
             self.send_command(0x20)
-            self.ReadBusy()
+            self.ReadBusy('refresh')
         
         else:
             self.send_command(0x12)
             epdconfig.delay_ms(100) 
-            self.ReadBusy()
+            self.ReadBusy('refresh')
             
     def init(self):
         i = 0x00
@@ -114,9 +122,9 @@ class EPD:
 
         if(i == 0x01):
             self.flag = 1
-            self.ReadBusy()
+            self.ReadBusy('reset')
             self.send_command(0x12)
-            self.ReadBusy()
+            self.ReadBusy('reset')
 
             self.send_command(0x3C)
             self.send_data(0x05)	
@@ -142,12 +150,12 @@ class EPD:
             self.send_command(0x4F)  
             self.send_data(0x00)    
             self.send_data(0x00)
-            self.ReadBusy()
+            self.ReadBusy('reset')
 
         else:
             self.flag = 0
             self.send_command(0x04)  # POWER_ON
-            self.ReadBusy()
+            self.ReadBusy('power_on')
 
             self.send_command(0x00)  # panel setting
             self.send_data(0x0f)
@@ -155,28 +163,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         high = self.height
@@ -187,25 +174,17 @@ class EPD:
         
         if(self.flag == 1):
             self.send_command(0x24)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(imageblack[i + j * wide]) 
+            self.send_data2(imageblack)
                     
             self.send_command(0x26)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(~imagered[i + j * wide]) 
+            self.send_data2(epdbuffer.invert(imagered))
         
         else:
             self.send_command(0x10)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(imageblack[i + j * wide]) 
+            self.send_data2(imageblack)
                     
             self.send_command(0x13)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(~imagered[i + j * wide]) 
+            self.send_data2(epdbuffer.invert(imagered))
 
         self.TurnOnDisplay()
         
@@ -218,25 +197,17 @@ class EPD:
 
         if(self.flag == 1):
             self.send_command(0x24)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0xff) 
+            self.send_data2(epdbuffer.fill(0xff, (wide * high)))
                     
             self.send_command(0x26)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0x00) 
+            self.send_data2(epdbuffer.fill(0x00, (wide * high)))
         
         else:
             self.send_command(0x10)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0xff) 
+            self.send_data2(epdbuffer.fill(0xff, (wide * high)))
                     
             self.send_command(0x13)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0x00) 
+            self.send_data2(epdbuffer.fill(0x00, (wide * high)))
 
         self.TurnOnDisplay()
 
@@ -249,7 +220,7 @@ class EPD:
             self.send_command(0X50) 
             self.send_data(0xf7)             
             self.send_command(0X02)
-            self.ReadBusy() 
+            self.ReadBusy('power_off') 
             self.send_command(0X07) 
             self.send_data(0xA5)
         
@@ -31,6 +31,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+from . import epdquant
 
 import PIL
 from PIL import Image
@@ -40,6 +42,18 @@ import io
 EPD_WIDTH       = 600
 EPD_HEIGHT      = 448
 
+# Busy deadlines per phase in ms, a full refresh takes about 30 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  60000,
+    'power_off': 2000,
+}
+
+# Panel colors in index order: BLACK, WHITE, GREEN, BLUE, RED, YELLOW, ORANGE
+EPD_PALETTE     = ((0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255),
+                   (255, 0, 0), (255, 255, 0), (255, 128, 0))
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -50,6 +64,9 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
+        self.palette = EPD_PALETTE    # may be replaced by the measured ink colors
+        self.dither = epdquant.DITHER_DEFAULT
         self.BLACK  = 0x000000   #   0000  BGR
         self.WHITE  = 0xffffff   #   0001
         self.GREEN  = 0x00ff00   #   0010
@@ -87,16 +104,14 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
 
-    def ReadBusyHigh(self):
+    def ReadBusyHigh(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
-    def ReadBusyLow(self):
+    def ReadBusyLow(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def init(self):
@@ -105,7 +120,7 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('reset')
         self.send_command(0x00)
         self.send_data(0xEF)
         self.send_data(0x08)
@@ -143,10 +158,6 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 7 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0) + (0,0,0)*249)
-
         # Check if we need to rotate the image
         imwidth, imheight = image.size
         if(imwidth == self.width and imheight == self.height):
@@ -156,19 +167,10 @@ class EPD:
         else:
             logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
 
-        # Convert the soruce image to the 7 colors, dithering if needed
-        image_7color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_7color = bytearray(image_7color.tobytes('raw'))
-
+        # Convert the soruce image to the 7 colors, dithering if needed.
         # PIL does not support 4 bit color, so pack the 4 bits of color
         # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 2)
-        idx = 0
-        for i in range(0, len(buf_7color), 2):
-            buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
-            idx += 1
-
-        return buf
+        return epdquant.quantize_pack(image_temp, self.palette, self.dither, 4)
 
     def display(self,image):
         self.send_command(0x61) #Set Resolution setting
@@ -180,11 +182,11 @@ class EPD:
 
         self.send_data2(image)
         self.send_command(0x04) #0x04
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('power_on')
         self.send_command(0x12) #0x12
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('refresh')
         self.send_command(0x02) #0x02
-        self.ReadBusyLow()
+        self.ReadBusyLow('power_off')
         epdconfig.delay_ms(500)
 
     def Clear(self):
@@ -196,15 +198,15 @@ class EPD:
         self.send_command(0x10)
 
         # Set all pixels to white
-        buf = [0x11] * int(self.width * self.height / 2)
+        buf = epdbuffer.fill(0x11, int(self.width * self.height / 2))
         self.send_data2(buf)
 
         self.send_command(0x04) #0x04
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('power_on')
         self.send_command(0x12) #0x12
-        self.ReadBusyHigh()
+        self.ReadBusyHigh('refresh')
         self.send_command(0x02) #0x02
-        self.ReadBusyLow()
+        self.ReadBusyLow('power_off')
         epdconfig.delay_ms(500)
 
     def sleep(self):
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 792
 EPD_HEIGHT      = 272
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 GRAY1  = 0xff #white
 GRAY2  = 0xC0
 GRAY3  = 0x80 #gray
@@ -50,6 +59,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         self.GRAY1  = GRAY1 #white
         self.GRAY2  = GRAY2
         self.GRAY3  = GRAY3 #gray
@@ -125,10 +135,9 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
@@ -136,28 +145,28 @@ class EPD:
         self.send_data(0xF7)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
         epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('refresh')                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Fast(self):
         self.send_command(0x22)
         self.send_data(0xC7)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
         epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('refresh')                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Partial(self):
         self.send_command(0x22)
         self.send_data(0xFF)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
         epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('refresh')                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_4GRAY(self):
         self.send_command(0x22)
         self.send_data(0xCF)          
         self.send_command(0x20)			# DISPLAY REFRESH 	
         epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('refresh')                 # waiting for the electronic paper IC to release the idle signal
 
     def EPD_5in79_Lut(self):
         self.send_command(0x32)
@@ -181,9 +190,9 @@ class EPD:
             return -1
             
         self.reset()
-        self.ReadBusy()             # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('reset')             # waiting for the electronic paper IC to release the idle signal
         self.send_command(0x12)     # POWER ON
-        self.ReadBusy()             # waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('reset')             # waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x11)
         self.send_data(0x01)
@@ -203,7 +212,7 @@ class EPD:
         self.send_data(0x0f)  
         self.send_data(0x01) 	
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         self.send_command(0x91)
         self.send_data(0x00)
@@ -223,7 +232,7 @@ class EPD:
         self.send_data(0x0f)  
         self.send_data(0x01)
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         return 0
 
@@ -232,9 +241,9 @@ class EPD:
             return -1
             
         self.reset()
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x12)
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x18)
         self.send_data(0x80)	
@@ -242,7 +251,7 @@ class EPD:
         self.send_command(0x22)
         self.send_data(0xB1)		
         self.send_command(0x20)	
-        self.ReadBusy()   
+        self.ReadBusy('refresh')   
 
         self.send_command(0x1A)
         self.send_data(0x64)		
@@ -251,7 +260,7 @@ class EPD:
         self.send_command(0x22)
         self.send_data(0x91)		
         self.send_command(0x20)	
-        self.ReadBusy()   
+        self.ReadBusy('refresh')   
 
         self.send_command(0x11)
         self.send_data(0x01)
@@ -271,7 +280,7 @@ class EPD:
         self.send_data(0x0f)  
         self.send_data(0x01) 	
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         self.send_command(0x91)
         self.send_data(0x00)
@@ -291,7 +300,7 @@ class EPD:
         self.send_data(0x0f)  
         self.send_data(0x01)
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         return 0
     
@@ -300,9 +309,9 @@ class EPD:
             return -1
             
         self.reset()
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x12)
-        self.ReadBusy() 
+        self.ReadBusy('reset') 
 
         self.send_command(0x3C)
         self.send_data(0x80)
@@ -314,9 +323,9 @@ class EPD:
             return -1
             
         self.reset()
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
         self.send_command(0x12) 
-        self.ReadBusy() 
+        self.ReadBusy('reset') 
 
         self.send_command(0x0C)     
         self.send_data(0x8B)    
@@ -327,7 +336,7 @@ class EPD:
         self.send_command(0x3C)
         self.send_data(0x81)
 
-        self.ReadBusy()	
+        self.ReadBusy('reset')	
 
         self.send_command(0x11)
         self.send_data(0x01)
@@ -347,7 +356,7 @@ class EPD:
         self.send_data(0x0f)  
         self.send_data(0x01) 	
 
-        self.ReadBusy()   
+        self.ReadBusy('reset')   
 
         self.send_command(0x91)
         self.send_data(0x00)
@@ -371,64 +380,10 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.pack_gray4(image, self.width, self.height)
 
     def display(self, imageblack):
         Width =int(self.width / 16)+1
@@ -438,13 +393,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.TurnOnDisplay()
 
@@ -456,13 +411,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.TurnOnDisplay()
 
@@ -479,22 +434,22 @@ class EPD:
         Width1 =int(self.width / 8)
         
         self.send_command(0x24)
-        self.send_data2([color] * 13600)
+        self.send_data2(epdbuffer.fill(color, 13600))
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.send_command(0xA4)
-        self.send_data2([color] * 13600)
+        self.send_data2(epdbuffer.fill(color, 13600))
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.TurnOnDisplay()
 
         self.send_command(0x26)
-        self.send_data2([color] * 13600)
+        self.send_data2(epdbuffer.fill(color, 13600))
 
         self.send_command(0xA6)
-        self.send_data2([color] * 13600)
+        self.send_data2(epdbuffer.fill(color, 13600))
 
     def display_Fast(self, imageblack):
         Width =int(self.width / 16)+1
@@ -504,13 +459,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.TurnOnDisplay_Fast()
     
@@ -563,102 +518,36 @@ class EPD:
         Width =int(self.width / 16)+1
         Width1 =int(self.width / 8)
 
+        # plane bit per gray code: black, gray2, gray1, white
+        plane1, plane2 = epdbuffer.split_gray4(image, (0, 1, 0, 1), (0, 0, 1, 1))
+        # the master controller drives the left half, the slave the right half
+        master1 = b''.join(plane1[j * Width1 : j * Width1 + Width] for j in range(self.height))
+        master2 = b''.join(plane2[j * Width1 : j * Width1 + Width] for j in range(self.height))
+        slave1 = b''.join(plane1[j * Width1 + Width - 1 : (j + 1) * Width1] for j in range(self.height))
+        slave2 = b''.join(plane2[j * Width1 + Width - 1 : (j + 1) * Width1] for j in range(self.height))
+
         self.send_command(0x24)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0x26)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
+        self.send_data2(master1)
+        self.send_command(0x26)
+        self.send_data2(master2)
 
         self.send_command(0xA4)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0xA6)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-        
+        self.send_data2(slave1)
+        self.send_command(0xA6)
+        self.send_data2(slave2)
+
         self.TurnOnDisplay_4GRAY()
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(epdbuffer.fill(0xFF, 13600))
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.send_command(0xA4)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(epdbuffer.fill(0xFF, 13600))
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(epdbuffer.fill(0x00, 13600))
 
         self.TurnOnDisplay()
 
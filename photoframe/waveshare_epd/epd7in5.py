@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 640
 EPD_HEIGHT      = 384
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
     
     # Hardware reset
     def reset(self):
@@ -73,10 +83,9 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -95,7 +104,7 @@ class EPD:
         self.send_data2([0xc7, 0xcc, 0x28])
         
         self.send_command(0x04) # POWER_ON
-        self.ReadBusy()
+        self.ReadBusy('power_on')
         
         self.send_command(0x30) # PLL_CONTROL
         self.send_data(0x3c)
@@ -127,54 +136,36 @@ class EPD:
     def getbuffer(self, image):
         img = image
         imwidth, imheight = img.size
-        halfwidth = int(self.width / 2)
-        buf = [0x33] * halfwidth * self.height
-        
         if(imwidth == self.width and imheight == self.height):
             img = img.convert('1')
         elif(imwidth == self.height and imheight == self.width):
             img = img.rotate(90, expand=True).convert('1')
-            imwidth, imheight = img.size
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return buf
-        
-        pixels = img.load()
+            return b'\x33' * (int(self.width / 2) * self.height)
 
-        for y in range(imheight):
-            offset = y * halfwidth
-            for x in range(1, imwidth, 2):
-                i = offset + x // 2
-                if(pixels[x-1, y] > 191):
-                    if(pixels[x, y] > 191):
-                        buf[i] = 0x33
-                    else:
-                        buf[i] = 0x30
-                else:
-                    if(pixels[x, y] > 191):
-                        buf[i] = 0x03
-                    else:
-                        buf[i] = 0x00
-        return buf
+        # white -> 0x3, black -> 0x0, two pixels per byte
+        levels = img.convert('L').point(lambda p: 3 if p > 191 else 0)
+        return epdbuffer.pack_indices(levels, 4)
         
     def display(self, image):
         self.send_command(0x10)
         self.send_data2(image)
         self.send_command(0x12)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def Clear(self):
-        buf = [0x33] * int(self.width * self.height / 2)
+        buf = epdbuffer.fill(0x33, int(self.width * self.height / 2))
         self.send_command(0x10)
         self.send_data2(buf)
         self.send_command(0x12)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
-        self.ReadBusy()
+        self.ReadBusy('power_off')
         
         self.send_command(0x07) # DEEP_SLEEP
         self.send_data(0XA5)
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 880
 EPD_HEIGHT      = 528
 
+# Busy deadlines per phase in ms, a full refresh takes a few seconds
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  20000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
     
     # Hardware reset
     def reset(self):
@@ -73,11 +83,9 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         epdconfig.delay_ms(200)
         
     def init(self):
@@ -86,16 +94,16 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x12)  #SWRESET
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x46)  # Auto Write Red RAM
         self.send_data(0xf7)
-        self.ReadBusy()
+        self.ReadBusy('reset')
         self.send_command(0x47)  # Auto Write  B/W RAM
         self.send_data(0xf7)
-        self.ReadBusy()
+        self.ReadBusy('reset')
 
         self.send_command(0x0C)  # Soft start setting
         self.send_data2([0xAE, 0xC7, 0xC3, 0xC0, 0x40])
@@ -121,7 +129,7 @@ class EPD:
         self.send_command(0x22)
         self.send_data(0XB1) #Load Temperature and waveform setting.
         self.send_command(0x20)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
         self.send_command(0x4E) # set RAM x address count to 0
         self.send_data2([0x00, 0x00])
@@ -140,9 +148,9 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0xff] * int(self.width * self.height / 8)
+            return epdbuffer.fill(0xff, int(self.width * self.height / 8))
 
-        buf = bytearray(img.tobytes('raw'))
+        buf = img.tobytes('raw')
         return buf
         
     def display(self, image):
@@ -154,10 +162,10 @@ class EPD:
         self.send_data(0xF7)#Load LUT from MCU(0x32)
         self.send_command(0x20)
         epdconfig.delay_ms(10)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def Clear(self):
-        buf = [0xff] * int(self.width * self.height / 8)
+        buf = epdbuffer.fill(0xff, int(self.width * self.height / 8))
         self.send_command(0x4F) 
         self.send_data2([0x00, 0x00])
         self.send_command(0x24)
@@ -170,7 +178,7 @@ class EPD:
         self.send_data(0xF7)#Load LUT from MCU(0x32)
         self.send_command(0x20)
         epdconfig.delay_ms(10)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0x10)
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 880
 EPD_HEIGHT      = 528
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
 
     # Hardware reset
     def reset(self):
@@ -66,12 +76,17 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte2(data)
+        epdconfig.digital_write(self.cs_pin, 1)
         
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 0, self.busy_timeout_ms[phase], phase)
         epdconfig.delay_ms(200)
             
     def init(self):
@@ -81,15 +96,15 @@ class EPD:
         self.reset()
         
         self.send_command(0x12) 		  #SWRESET
-        self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('reset')        #waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x46)  # Auto Write RAM
         self.send_data(0xF7)
-        self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('reset')        #waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x47)  # Auto Write RAM
         self.send_data(0xF7)
-        self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('reset')        #waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x0C)  # Soft start setting
         self.send_data(0xAE)
@@ -125,7 +140,7 @@ class EPD:
         self.send_command(0x22)
         self.send_data(0XB1)	#Load Temperature and waveform setting.
         self.send_command(0x20)
-        self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
+        self.ReadBusy('refresh')        #waiting for the electronic paper IC to release the idle signal
 
         self.send_command(0x4E) 
         self.send_data(0x00)
@@ -137,66 +152,41 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_mono(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         self.send_command(0x4F) 
         self.send_data(0xAf)
         
         self.send_command(0x24)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(imageblack[i])
+        self.send_data2(imageblack)
         
         
         self.send_command(0x26)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(~imagered[i])
+        self.send_data2(epdbuffer.invert(imagered))
         
         self.send_command(0x22)
         self.send_data(0xC7)    #Load LUT from MCU(0x32)
         self.send_command(0x20)
         epdconfig.delay_ms(200)      #!!!The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def Clear(self):
         self.send_command(0x4F) 
         self.send_data(0xAf)
         
         self.send_command(0x24)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
+        self.send_data2(epdbuffer.fill(0xff, int(self.width * self.height / 8)))
         
         
         self.send_command(0x26)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_data2(epdbuffer.fill(0x00, int(self.width * self.height / 8)))
         
         self.send_command(0x22)
         self.send_data(0xC7)    #Load LUT from MCU(0x32)
         self.send_command(0x20)
         epdconfig.delay_ms(200)      #!!!The delay here is necessary, 200uS at least!!!     
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0x10)  	#deep sleep
@@ -30,11 +30,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
 EPD_HEIGHT      = 480
 
+# Busy deadlines per phase in ms, a full refresh takes about 15 s
+BUSY_TIMEOUT_MS = {
+    'reset':     2000,
+    'power_on':  2000,
+    'refresh':  40000,
+    'power_off': 2000,
+}
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -45,6 +54,7 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self.busy_timeout_ms = dict(BUSY_TIMEOUT_MS)
         self.partFlag=1
 
     # Hardware reset
@@ -74,13 +84,10 @@ class EPD:
         epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
 
-    def ReadBusy(self):
+    def ReadBusy(self, phase='reset'):
         logger.debug("e-Paper busy")
         self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 1, self.busy_timeout_ms[phase], phase)
         epdconfig.delay_ms(200)
         logger.debug("e-Paper busy release")
         
@@ -105,7 +112,7 @@ class EPD:
 
         self.send_command(0x04)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('power_on')
 
         self.send_command(0X00)
         self.send_data(0x0F)
@@ -140,7 +147,7 @@ class EPD:
 
         self.send_command(0x04)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('power_on')
 
         self.send_command(0x06)
         self.send_data(0x27)
@@ -170,7 +177,7 @@ class EPD:
 
         self.send_command(0x04)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('power_on')
 
         self.send_command(0xE0)
         self.send_data(0x02)
@@ -195,28 +202,24 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return epdbuffer.fill(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
+        buf = epdbuffer.invert(img.tobytes('raw'))
         return buf
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
         # The black bytes need to be inverted back from what getbuffer did
-        for i in range(len(imageblack)):
-            imageblack[i] ^= 0xFF
-        self.send_data2(imageblack)
+        self.send_data2(epdbuffer.invert(imageblack))
 
         self.send_command(0x13)
         self.send_data2(imagered)
         
         self.send_command(0x12)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def display_Base_color(self, color):
         if(self.width % 8 == 0):
@@ -225,18 +228,14 @@ class EPD:
             Width = self.width // 8 +1
         Height = self.height
         self.send_command(0x10)   #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                self.send_data(color)
+        self.send_data2(epdbuffer.fill(color, (Width * Height)))
                 
         self.send_command(0x13)  #Write Black and White image to RAM
-        for j in range(Height):
-            for i in range(Width):
-                self.send_data(~color)
+        self.send_data2(epdbuffer.fill(~color & 0xFF, (Width * Height)))
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
         if((Xstart % 8 + Xend % 8 == 8 & Xstart % 8 > Xend % 8) | Xstart % 8 + Xend % 8 == 0 | (Xend - Xstart)%8 == 0):
@@ -274,20 +273,18 @@ class EPD:
         if self.partFlag == 1:
             self.partFlag = 0
             self.send_command(0x10)
-            for j in range(Height):
-                    for i in range(Width):
-                        self.send_data(0xff)
+            self.send_data2(epdbuffer.fill(0xff, (Width * Height)))
 
         self.send_command(0x13)   #Write Black and White image to RAM
         self.send_data2(Image)
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
         
     def Clear(self):
-        buf = [0x00] * (int(self.width/8) * self.height)
-        buf2 = [0xff] * (int(self.width/8) * self.height)
+        buf = epdbuffer.fill(0x00, (int(self.width/8) * self.height))
+        buf2 = epdbuffer.fill(0xff, (int(self.width/8) * self.height))
         self.send_command(0x10)
         self.send_data2(buf2)
             
@@ -296,11 +293,11 @@ class EPD:
                 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
-        self.ReadBusy()
+        self.ReadBusy('refresh')
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
-        self.ReadBusy()
+        self.ReadBusy('power_off')
         
         self.send_command(0x07) # DEEP_SLEEP
         self.send_data(0XA5)
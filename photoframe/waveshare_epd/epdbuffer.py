@@ -0,0 +1,263 @@
+# *****************************************************************************
+# * | File        :	  epdbuffer.py
+# * | Function    :   Frame buffer packing shared by the e-paper drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# # | Info        :
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import logging
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Frame buffer contract: getbuffer returns bytes (or another buffer such as
+# bytearray/memoryview), display and send_data2 hand it on to
+# epdconfig.spi_writebyte2 as is. spidev's writebytes2 reads such buffers in
+# place, where a list of ints would first be converted element by element.
+
+# bytes.translate table that flips every bit of a byte
+INVERT_TABLE = bytes(range(255, -1, -1))
+
+# 4-gray codes: 0 = black (0x00), 1 = gray2 (0x40), 2 = gray1 (0x80), 3 = white (0xC0).
+# The drawing colors 0xC0 and 0x80 are shown one level darker, every other
+# gray value by its two most significant bits.
+GRAY4_TABLE = [{0xC0: 2, 0x80: 1}.get(level, level >> 6) for level in range(256)]
+
+
+def image_indices(image):
+    """Return the pixels of a 'P' or 'L' image as a (height, width) uint8 array."""
+    width, height = image.size
+    return np.frombuffer(image.tobytes('raw'), dtype=np.uint8).reshape(height, width)
+
+
+def pack_indices(indices, bits_per_pixel):
+    """Pack palette indices into a panel buffer.
+
+    indices is a 'P'/'L' image or a (height, width) uint8 array. Pixels are
+    stored MSB first, 8 // bits_per_pixel per byte, and every row is padded
+    with index 0 up to a whole byte. Returns an immutable bytes object.
+    """
+    if not isinstance(indices, np.ndarray):
+        indices = image_indices(indices)
+    per_byte = 8 // bits_per_pixel
+    mask = (1 << bits_per_pixel) - 1
+    height, width = indices.shape
+    padding = -width % per_byte
+    if padding:
+        indices = np.pad(indices, ((0, 0), (0, padding)))
+
+    packed = np.zeros((height, (width + padding) // per_byte), dtype=np.uint8)
+    for i in range(per_byte):
+        shift = 8 - bits_per_pixel * (i + 1)
+        packed |= (indices[:, i::per_byte] & mask) << shift
+    return packed.tobytes()
+
+
+def unpack_indices(buf, bits_per_pixel, width, height):
+    """Undo pack_indices: return the (height, width) uint8 index array of a buffer.
+
+    Used for previews of rendered frames; the row padding is dropped.
+    """
+    per_byte = 8 // bits_per_pixel
+    mask = (1 << bits_per_pixel) - 1
+    packed = np.frombuffer(buf, dtype=np.uint8).reshape(height, -1)
+    shifts = np.array([8 - bits_per_pixel * (i + 1) for i in range(per_byte)], dtype=np.uint8)
+    indices = (packed[:, :, None] >> shifts) & mask
+    return indices.reshape(height, -1)[:, :width]
+
+
+def match_colors(image, palette):
+    """Map an RGB image to palette indices by exact color match.
+
+    palette is a sequence of (r, g, b) tuples; the first matching entry wins
+    and pixels that match none of them get index 0. Returns a (height, width)
+    uint8 array.
+    """
+    width, height = image.size
+    pixels = np.frombuffer(image.convert('RGB').tobytes('raw'), dtype=np.uint8)
+    pixels = pixels.reshape(height, width, 3).astype(np.uint32)
+    colors = (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+    indices = np.zeros((height, width), dtype=np.uint8)
+    for index in reversed(range(len(palette))):
+        r, g, b = palette[index]
+        indices[colors == ((r << 16) | (g << 8) | b)] = index
+    return indices
+
+
+@lru_cache(maxsize=16)
+def fill(value, size):
+    """Return a size byte buffer of value, e.g. for Clear.
+
+    The buffers are immutable, so each (value, size) pair is built once and
+    shared by every later call.
+    """
+    return bytes([value & 0xFF]) * int(size)
+
+
+def invert(buf):
+    """Return a bytes copy of buf with every bit flipped."""
+    return bytes(buf).translate(INVERT_TABLE)
+
+
+def window(buf, linewidth, height, xstart, ystart, xend, yend):
+    """Return the bytes of a partial refresh window of a frame buffer.
+
+    buf holds height rows of linewidth bytes; the window covers the byte
+    columns xstart..xend and the rows ystart..yend, both inclusive and clipped
+    to the frame, in the order the controller's RAM pointer walks them.
+    """
+    buf = bytes(buf)
+    xstart, ystart = max(xstart, 0), max(ystart, 0)
+    xend, yend = min(xend, linewidth - 1), min(yend, height - 1)
+    if xend < xstart:
+        return b''
+    return b''.join(buf[xstart + j * linewidth : xend + 1 + j * linewidth]
+                    for j in range(ystart, yend + 1))
+
+
+@lru_cache(maxsize=None)
+def _expand_lut(bits_in, bits_out, codes):
+    # For every input byte: its pixels mapped through codes, bits_out each
+    per_byte = 8 // bits_in
+    mask = (1 << bits_in) - 1
+    lut = np.zeros((256, per_byte * bits_out // 8), dtype=np.uint8)
+    for byte in range(256):
+        value = 0
+        for shift in range(8 - bits_in, -1, -bits_in):
+            value = (value << bits_out) | codes[(byte >> shift) & mask]
+        lut[byte] = list(value.to_bytes(lut.shape[1], 'big'))
+    return lut
+
+
+def _expand(buf, bits_in, bits_out, codes):
+    data = np.frombuffer(bytes(buf), dtype=np.uint8)
+    return _expand_lut(bits_in, bits_out, tuple(codes))[data]
+
+
+def expand_pixels(buf, bits_in, bits_out, codes):
+    """Re-pack a buffer with a wider pixel format for the controller's RAM.
+
+    Every bits_in pixel value v of buf becomes codes[v] stored in bits_out
+    bits, MSB first, using one 256-entry table lookup per byte.
+    """
+    return _expand(buf, bits_in, bits_out, codes).tobytes()
+
+
+def merge_planes(black, red, codes):
+    """Merge a black and a red 1bpp plane into one 4bpp buffer.
+
+    codes gives the 4 bit value for black, white and red pixels. A 0 bit in
+    the red plane wins over the black plane.
+    """
+    red_mask = _expand(red, 1, 4, (0xF, 0x0))
+    merged = _expand(black, 1, 4, codes[:2]) & ~red_mask
+    merged |= _expand(red, 1, 4, (codes[2], 0x0))
+    return merged.tobytes()
+
+
+def pack_bits(white):
+    """Pack a (height, width) bool array, True = white, into a 1bpp buffer.
+
+    Bits are stored MSB first and every row is padded with white up to a
+    whole byte. Returns an immutable bytes object.
+    """
+    padding = -white.shape[1] % 8
+    if padding:
+        white = np.pad(white, ((0, 0), (0, padding)), constant_values=True)
+    return np.packbits(white, axis=1).tobytes()
+
+
+def pack_mono(image, width, height):
+    """Convert image to the 1bpp buffer of a width x height panel.
+
+    The image is converted to '1' first and a portrait (height x width) image
+    is then turned into the panel's scan orientation with a lossless
+    transpose, which gives the same dithering as converting pixel by pixel.
+    Bits are 1 = white, rows are padded with white up to a whole byte, and an
+    image of any other size yields a blank buffer.
+    """
+    image_monocolor = image.convert('1')
+    imwidth, imheight = image_monocolor.size
+    if imwidth == width and imheight == height:
+        pass
+    elif imwidth == height and imheight == width:
+        image_monocolor = image_monocolor.transpose(Image.ROTATE_90)
+    else:
+        logger.warning("Wrong image dimensions: must be %dx%d" % (width, height))
+        return b'\xff' * (((width + 7) // 8) * height)
+
+    if width % 8 == 0:
+        return image_monocolor.tobytes('raw')
+    return pack_bits(np.asarray(image_monocolor))
+
+
+def pack_gray4(image, width, height, portrait=Image.ROTATE_90):
+    """Convert image to the 2bpp 4-gray buffer of a width x height panel.
+
+    Gray levels are mapped through GRAY4_TABLE in a single Image.point pass,
+    without touching the caller's image. A portrait (height x width) image is
+    brought into scan orientation with the transpose method portrait; an
+    image of any other size yields a blank buffer.
+    """
+    image_monocolor = image.convert('L')
+    imwidth, imheight = image_monocolor.size
+    if imwidth == width and imheight == height:
+        pass
+    elif imwidth == height and imheight == width:
+        image_monocolor = image_monocolor.transpose(portrait)
+    else:
+        logger.warning("Wrong image dimensions: must be %dx%d" % (width, height))
+        return b'\xff' * (int(width / 4) * height)
+    return pack_indices(image_monocolor.point(GRAY4_TABLE), 2)
+
+
+@lru_cache(maxsize=None)
+def _gray4_lut(bits1, bits2):
+    # For every packed 4-gray byte: plane 1 nibble << 4 | plane 2 nibble
+    lut = np.zeros(256, dtype=np.uint8)
+    for byte in range(256):
+        nibble1 = nibble2 = 0
+        for shift in (6, 4, 2, 0):
+            code = (byte >> shift) & 0x03
+            nibble1 = (nibble1 << 1) | bits1[code]
+            nibble2 = (nibble2 << 1) | bits2[code]
+        lut[byte] = (nibble1 << 4) | nibble2
+    return lut
+
+
+def split_gray4(buf, bits1, bits2):
+    """Split a packed 4-gray buffer into the controller's two 1bpp RAM planes.
+
+    bits1 and bits2 give the bit each plane stores for the gray codes black,
+    gray2, gray1 and white. Both planes come out of a single 256-entry table
+    lookup and are returned as bytes objects of len(buf) // 2 bytes each.
+    """
+    data = np.frombuffer(bytes(buf), dtype=np.uint8)
+    nibbles = _gray4_lut(tuple(bits1), tuple(bits2))[data]
+    plane1 = (nibbles[0::2] & 0xF0) | (nibbles[1::2] >> 4)
+    plane2 = (nibbles[0::2] << 4) | (nibbles[1::2] & 0x0F)
+    return plane1.tobytes(), plane2.tobytes()
@@ -31,12 +31,62 @@ import os
 import logging
 import sys
 import time
-import subprocess
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# Pin definition, identical on all backends. Available without constructing
+# the backend, so EPD() does not touch the hardware.
+RST_PIN  = 17
+DC_PIN   = 25
+CS_PIN   = 8
+BUSY_PIN = 24
+PWR_PIN  = 18
+
+# Longest single wait_for_edge call. An edge that slips in between reading the
+# level and arming the edge detection is picked up after at most this long.
+EDGE_WAIT_SLICE_MS = 100
+
+
+def wait_for_level(GPIO, pin, value, timeout_ms=None):
+    """Block on edge events of a Jetson.GPIO style module until pin reads value.
+
+    Returns True once the level is reached and False when timeout_ms (None =
+    wait forever) expires first.
+    """
+    deadline = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000.0
+    edge = GPIO.RISING if value else GPIO.FALLING
+    while GPIO.input(pin) != value:
+        slice_ms = EDGE_WAIT_SLICE_MS
+        if deadline is not None:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return False
+            slice_ms = min(slice_ms, remaining_ms)
+        GPIO.wait_for_edge(pin, edge, timeout=slice_ms)
+    return True
+
+
+# Deadline for a busy phase when the driver does not give its own. Long enough
+# for the slowest full refresh (7-color panels need about 30 s).
+BUSY_TIMEOUT_MS = 60000
+
+
+class BusyTimeoutError(TimeoutError):
+    """The panel did not release the BUSY pin before the deadline."""
+
+
+def wait_busy(pin, value, timeout_ms=None, phase="busy"):
+    """Wait until the BUSY pin reads value, raise BusyTimeoutError after timeout_ms.
+
+    phase names the wait (e.g. 'refresh') in the error message.
+    """
+    if timeout_ms is None:
+        timeout_ms = BUSY_TIMEOUT_MS
+    if not get_implementation().digital_wait(pin, value, timeout_ms):
+        raise BusyTimeoutError("e-Paper %s: BUSY not released within %d ms" % (phase, timeout_ms))
+
 
 class RaspberryPi:
     # Pin definition
@@ -95,6 +145,14 @@ class RaspberryPi:
         elif pin == self.PWR_PIN:
             return self.PWR_PIN.value
 
+    def digital_wait(self, pin, value, timeout_ms=None):
+        # gpiozero keeps the button state up to date from edge events, so the
+        # thread sleeps on an Event until BUSY reaches value
+        timeout = None if timeout_ms is None else timeout_ms / 1000.0
+        if value:
+            return bool(self.GPIO_BUSY_PIN.wait_for_press(timeout))
+        return bool(self.GPIO_BUSY_PIN.wait_for_release(timeout))
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -102,6 +160,7 @@ class RaspberryPi:
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
+        # Accepts any buffer (bytes, mmap), spidev writes it in bufsiz chunks without a Python copy
         self.SPI.writebytes2(data)
 
     def DEV_SPI_write(self, data):
@@ -198,6 +257,9 @@ class JetsonNano:
     def digital_read(self, pin):
         return self.GPIO.input(self.BUSY_PIN)
 
+    def digital_wait(self, pin, value, timeout_ms=None):
+        return wait_for_level(self.GPIO, self.BUSY_PIN, value, timeout_ms)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -256,6 +318,9 @@ class SunriseX3:
     def digital_read(self, pin):
         return self.GPIO.input(pin)
 
+    def digital_wait(self, pin, value, timeout_ms=None):
+        return wait_for_level(self.GPIO, pin, value, timeout_ms)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -265,7 +330,11 @@ class SunriseX3:
     def spi_writebyte2(self, data):
         # for i in range(len(data)):
         #     self.SPI.writebytes([data[i]])
-        self.SPI.xfer3(data)
+        if isinstance(data, list):
+            self.SPI.xfer3(data)
+        else:
+            # bytes or an mmap'd cache file, sent from the buffer without a list copy
+            self.SPI.writebytes2(data)
 
     def module_init(self):
         if self.Flag == 0:
@@ -301,22 +370,220 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
+# Busy time in ms after a command (or after the reset pulse) for the simulated
+# backend. Approximate values, taken from the refresh times in the datasheets.
+SIM_BUSY_MS_UC = {'reset': 10, 0x04: 100, 0x12: 3000, 0x02: 100}    # UC81xx: 0x12 refreshes
+SIM_BUSY_MS_SSD = {'reset': 10, 0x12: 10, 0x20: 2000}               # SSD16xx: 0x12 is SWRESET
+SIM_BUSY_MS_7COLOR = {'reset': 10, 0x04: 200, 0x12: 30000, 0x02: 100}
+
+SIM_BUSY_MS = dict.fromkeys([
+    'epd13in3b', 'epd13in3k', 'epd1in54', 'epd1in54_V2', 'epd1in54b_V2',
+    'epd2in13', 'epd2in13_V2', 'epd2in13_V3', 'epd2in13_V4', 'epd2in13b_V4',
+    'epd2in15b', 'epd2in66', 'epd2in66b', 'epd2in7_V2', 'epd2in7b_V2',
+    'epd2in9', 'epd2in9_V2', 'epd2in9b_V4', 'epd3in7', 'epd4in26',
+    'epd4in2_V2', 'epd5in79', 'epd5in79b', 'epd7in5_HD', 'epd7in5b_HD'], SIM_BUSY_MS_SSD)
+SIM_BUSY_MS.update(dict.fromkeys(['epd4in01f', 'epd5in65f', 'epd7in3e', 'epd7in3f'], SIM_BUSY_MS_7COLOR))
+
+# spidev splits writebytes2 into ioctls of at most this many bytes
+SIM_SPI_BUFSIZ = 4096
+
+# Status byte returned by DEV_SPI_read. epd4in2b_V2 reads it after 0x2F:
+# 0x01 is the SSD variant, anything else the UC variant of SIM_BUSY_MS_UC
+SIM_SPI_READ = 0x00
+
+
+class Simulated:
+    """Hardware-free backend, selected with EPD_BACKEND=simulated or use_backend().
+
+    Counts SPI bytes, syscalls and GPIO toggles and replays the BUSY pin from
+    SIM_BUSY_MS on a virtual clock. EPD_SIM_TIME_SCALE (default 0) scales the
+    simulated delays into real sleeps, EPD_SIM_DRIVER fixes the timing table,
+    otherwise it is taken from the driver module that calls module_init.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self):
+        self._time_scale = float(os.environ.get('EPD_SIM_TIME_SCALE', 0))
+        self._driver = os.environ.get('EPD_SIM_DRIVER')
+        self._levels = {}
+        self._busy_until = 0.0
+        self._busy_idle = 1
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = dict.fromkeys(['bytes', 'spi_calls', 'syscalls', 'gpio_writes', 'gpio_toggles',
+                                     'spi_reads', 'busy_waits', 'busy_ms', 'delay_ms', 'sim_ms'], 0)
+
+    def stats(self):
+        return dict(self._stats)
+
+    def select_driver(self, name):
+        self._driver = name
+
+    def _advance(self, ms):
+        self._stats['sim_ms'] += ms
+        if self._time_scale > 0:
+            time.sleep(ms * self._time_scale / 1000.0)
+
+    def _start_busy(self, key):
+        table = SIM_BUSY_MS.get(self._driver, SIM_BUSY_MS_UC)
+        if key in table:
+            self._busy_until = self._stats['sim_ms'] + table[key]
+
+    def digital_write(self, pin, value):
+        self._stats['gpio_writes'] += 1
+        self._stats['syscalls'] += 1
+        value = 1 if value else 0
+        if self._levels.get(pin) != value:
+            self._stats['gpio_toggles'] += 1
+            if pin == self.RST_PIN and value:
+                self._start_busy('reset')
+        self._levels[pin] = value
+
+    def digital_read(self, pin):
+        self._stats['syscalls'] += 1
+        if pin == self.BUSY_PIN:
+            busy = self._stats['sim_ms'] < self._busy_until
+            return 1 - self._busy_idle if busy else self._busy_idle
+        return self._levels.get(pin, 0)
+
+    def digital_wait(self, pin, value, timeout_ms=None):
+        self._stats['busy_waits'] += 1
+        self._stats['syscalls'] += 1
+        self._busy_idle = 1 if value else 0
+        remaining = max(0, self._busy_until - self._stats['sim_ms'])
+        if timeout_ms is not None and remaining > timeout_ms:
+            self._stats['busy_ms'] += timeout_ms
+            self._advance(timeout_ms)
+            return False
+        self._stats['busy_ms'] += remaining
+        self._advance(remaining)
+        return True
+
+    def delay_ms(self, delaytime):
+        self._stats['delay_ms'] += delaytime
+        self._stats['syscalls'] += 1
+        self._advance(delaytime)
+
+    def spi_writebyte(self, data):
+        self._stats['bytes'] += len(data)
+        self._stats['spi_calls'] += 1
+        self._stats['syscalls'] += 1
+        # DC low: the byte is a command, which may start a busy phase
+        if len(data) == 1 and self._levels.get(self.DC_PIN) == 0:
+            self._start_busy(data[0])
+
+    def spi_writebyte2(self, data):
+        self._stats['bytes'] += len(data)
+        self._stats['spi_calls'] += 1
+        self._stats['syscalls'] += max(1, -(-len(data) // SIM_SPI_BUFSIZ))
+
+    # Software SPI of DEV_Config.so, used by epd4in2b_V2
+    def DEV_SPI_write(self, data):
+        self.spi_writebyte([data])
+
+    def DEV_SPI_nwrite(self, data):
+        self.spi_writebyte2(data)
+
+    def DEV_SPI_read(self):
+        self._stats['spi_reads'] += 1
+        self._stats['syscalls'] += 1
+        return SIM_SPI_READ
+
+    def module_init(self, *args, **kwargs):
+        if not os.environ.get('EPD_SIM_DRIVER'):
+            # Timing table of the driver whose init() called us
+            caller = sys._getframe(1).f_globals.get('__name__', '')
+            self._driver = caller.rpartition('.')[2]
+        self.digital_write(self.PWR_PIN, 1)
+        return 0
+
+    def module_exit(self, *args, **kwargs):
+        logger.debug("spi end")
+        self.digital_write(self.RST_PIN, 0)
+        self.digital_write(self.DC_PIN, 0)
+        self.digital_write(self.PWR_PIN, 0)
+        logger.debug("close 5V, Module enters 0 power consumption ...")
 
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
 
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+BACKENDS = {
+    'raspberrypi': RaspberryPi,
+    'jetsonnano':  JetsonNano,
+    'sunrisex3':   SunriseX3,
+    'simulated':   Simulated,
+    'sim':         Simulated,
+}
+
+implementation = None
+_backend_name = os.environ.get('EPD_BACKEND', '').lower() or None
+
+
+def _read_text(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('ascii', 'replace')
+    except OSError:
+        return ''
+
+
+def detect_platform():
+    """Name of the backend for this board, read from device tree and cpuinfo."""
+    model = _read_text('/proc/device-tree/model') or _read_text('/proc/cpuinfo')
+    if 'Raspberry' in model:
+        return 'raspberrypi'
+    if os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return 'sunrisex3'
+    return 'jetsonnano'
+
+
+def use_backend(name):
+    """Pick the backend by name instead of detecting it, e.g. 'simulated'.
+
+    Only possible before the first hardware call constructed the backend.
+    """
+    global _backend_name
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError("Unknown epdconfig backend: %s" % name)
+    if implementation is not None and not isinstance(implementation, BACKENDS[name]):
+        raise RuntimeError("epdconfig backend already initialised as %s" % type(implementation).__name__)
+    _backend_name = name
+
+
+def get_implementation():
+    """Construct the backend on first use and export its methods as module functions."""
+    global implementation
+    if implementation is None:
+        name = _backend_name or detect_platform()
+        if name not in BACKENDS:
+            raise ValueError("Unknown epdconfig backend: %s" % name)
+        logger.debug("epdconfig backend: %s" % name)
+        implementation = BACKENDS[name]()
+        for func in [x for x in dir(implementation) if not x.startswith('_')]:
+            setattr(sys.modules[__name__], func, getattr(implementation, func))
+    return implementation
+
+
+# Backend methods the module forwards before the backend exists
+BACKEND_FUNCTIONS = ('digital_write', 'digital_read', 'digital_wait', 'delay_ms',
+                     'spi_writebyte', 'spi_writebyte2', 'module_init', 'module_exit',
+                     'DEV_SPI_write', 'DEV_SPI_nwrite', 'DEV_SPI_read')
+
+
+def __getattr__(name):
+    # Hardware functions (digital_write, module_init, ...) appear here until
+    # the first call constructs the backend and binds them to the module.
+    # Any other name, e.g. a hasattr() probe, must not open GPIO/SPI
+    if name not in BACKEND_FUNCTIONS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    try:
+        return getattr(get_implementation(), name)
+    except AttributeError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 ### END OF FILE ###
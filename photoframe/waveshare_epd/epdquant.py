@@ -0,0 +1,372 @@
+# *****************************************************************************
+# * | File        :	  epdquant.py
+# * | Function    :   Palette quantization shared by the multi-color drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# # | Info        :
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from . import epdbuffer
+
+logger = logging.getLogger(__name__)
+
+# Dither modes
+DITHER_NONE = 'none'                    # nearest palette color
+DITHER_DIFFUSION = 'floyd-steinberg'    # error diffusion, serial
+DITHER_BAYER = 'bayer'                  # ordered, 8x8 Bayer matrix
+DITHER_BLUE_NOISE = 'blue-noise'        # ordered, 64x64 void-and-cluster mask
+DITHER_MODES = (DITHER_NONE, DITHER_DIFFUSION, DITHER_BAYER, DITHER_BLUE_NOISE)
+
+# Default for the drivers and the photo frame. Error diffusion is serial and
+# stays in Pillow's C loop; blue noise is one table lookup per pixel and
+# takes about 40 % of its time. Gray ramps come out close, fine color
+# detail is coarser, so 'floyd-steinberg' stays selectable for that
+DITHER_DEFAULT = DITHER_BLUE_NOISE
+
+# Amplitude of the ordered dither offsets in RGB levels. The inks sit on
+# corners of the RGB cube, so the offsets span a full 0 .. 255 gap
+ORDERED_SPREAD = 255
+
+# Side length of the blue-noise mask and the sigma of its energy filter
+BLUE_NOISE_SIZE = 64
+BLUE_NOISE_SIGMA = 1.5
+
+# Bits kept per channel for the lookup table: 5 gives a 32x32x32 table of
+# 32 KiB, fine enough that the cell centre and the pixel agree on the
+# nearest ink for all but a few colors right on a boundary
+LUT_BITS = 5
+
+# Bump when the table layout or the distance changes, old cache files are
+# then ignored
+LUT_VERSION = 1
+
+# Where built tables are kept between runs
+CACHE_DIR = os.environ.get('EPD_LUT_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'waveshare_epd'))
+
+
+def _build_lut(palette, bits):
+    levels = np.arange(1 << bits, dtype=np.float32) * (1 << (8 - bits)) + (1 << (7 - bits))
+    r, g, b = np.meshgrid(levels, levels, levels, indexing='ij')
+    cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+    colors = np.asarray(palette, dtype=np.float32)
+    # Squared RGB distance to every ink, the first of equally near inks wins
+    distance = ((cells[:, None, :] - colors[None, :, :]) ** 2).sum(axis=2)
+    return distance.argmin(axis=1).astype(np.uint8)
+
+
+def _cached_array(path, shape, build):
+    # Load an array from path, or build it and store it there for next time
+    if path:
+        try:
+            array = np.load(path)
+            if array.shape == shape:
+                return array
+        except (OSError, ValueError):
+            pass
+
+    array = build()
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug("Cannot cache %s: %s" % (path, e))
+    return array
+
+
+def _load_lut(palette, bits, cache_dir):
+    key = hashlib.sha1(repr((LUT_VERSION, bits, tuple(palette))).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, 'lut_%s.npy' % key) if cache_dir else None
+    return _cached_array(path, (1 << (3 * bits),), lambda: _build_lut(palette, bits))
+
+
+def bayer_matrix(size=8):
+    """Bayer threshold ranks 0 .. size*size-1 as a (size, size) array, size a power of two."""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+def _void_and_cluster(size, sigma, seed=0):
+    # Ulichney's void-and-cluster method on a torus. energy holds the
+    # Gaussian filtered pattern; the tightest cluster is the set pixel with
+    # the most energy, the largest void the free pixel with the least.
+    offsets = np.minimum(np.arange(size), size - np.arange(size))
+    kernel = np.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * sigma ** 2))
+
+    def add(pattern, energy, y, x, sign):
+        pattern[y, x] = sign > 0
+        energy += sign * np.roll(kernel, (y, x), axis=(0, 1))
+
+    def tightest(pattern, energy):
+        return np.unravel_index(np.where(pattern, energy, -np.inf).argmax(), pattern.shape)
+
+    def largest_void(pattern, energy):
+        return np.unravel_index(np.where(pattern, np.inf, energy).argmin(), pattern.shape)
+
+    rng = np.random.default_rng(seed)
+    pattern = np.zeros((size, size), dtype=bool)
+    energy = np.zeros((size, size))
+    for index in rng.choice(size * size, size * size // 10, replace=False):
+        add(pattern, energy, *np.unravel_index(index, pattern.shape), 1)
+
+    # Move pixels from clusters into voids until the pattern is even
+    while True:
+        cluster = tightest(pattern, energy)
+        add(pattern, energy, *cluster, -1)
+        void = largest_void(pattern, energy)
+        add(pattern, energy, *void, 1)
+        if void == cluster:
+            break
+
+    ranks = np.zeros((size, size), dtype=np.int64)
+    ones = int(pattern.sum())
+    prototype, prototype_energy = pattern.copy(), energy.copy()
+    for rank in range(ones - 1, -1, -1):
+        cluster = tightest(pattern, energy)
+        add(pattern, energy, *cluster, -1)
+        ranks[cluster] = rank
+
+    pattern, energy = prototype, prototype_energy
+    for rank in range(ones, size * size):
+        void = largest_void(pattern, energy)
+        add(pattern, energy, *void, 1)
+        ranks[void] = rank
+    return ranks
+
+
+def blue_noise_matrix(size=BLUE_NOISE_SIZE, cache_dir=CACHE_DIR):
+    """Blue-noise threshold ranks 0 .. size*size-1, cached on disk like the tables."""
+    path = os.path.join(cache_dir, 'bluenoise_%d_v%d.npy' % (size, LUT_VERSION)) if cache_dir else None
+    return _cached_array(path, (size, size), lambda: _void_and_cluster(size, BLUE_NOISE_SIGMA))
+
+
+@lru_cache(maxsize=None)
+def threshold_map(mode):
+    """Ordered dither offsets of a mode as a small tileable int16 array."""
+    if mode == DITHER_BAYER:
+        ranks = bayer_matrix()
+    elif mode == DITHER_BLUE_NOISE:
+        ranks = blue_noise_matrix()
+    else:
+        raise ValueError("Not an ordered dither mode: %s" % mode)
+    thresholds = (ranks + 0.5) / ranks.size - 0.5
+    return np.round(thresholds * ORDERED_SPREAD).astype(np.int16)
+
+
+class Quantizer:
+    """Maps RGB pixels to the panel's ink indices.
+
+    palette lists the (r, g, b) color of every panel index. It may hold the
+    measured ink colors instead of the nominal ones; pixels are matched
+    against it and come out as the index of the nearest entry.
+    """
+
+    def __init__(self, palette, bits=LUT_BITS, cache_dir=CACHE_DIR):
+        self.palette = tuple(tuple(int(c) for c in color) for color in palette)
+        self.bits = bits
+        self.lut = _load_lut(self.palette, bits, cache_dir)
+        # Per-channel table for Image.point: drop the bits below the table resolution
+        self.shift_table = [v >> (8 - bits) for v in range(256)] * 3
+        # Floyd-Steinberg runs in Pillow's C loop against the same palette
+        self.palette_image = Image.new('P', (1, 1))
+        self.palette_image.putpalette(sum(self.palette, ()) + (0, 0, 0) * (256 - len(self.palette)))
+
+    def nearest(self, image):
+        """Index of the nearest ink for every pixel, one table lookup each."""
+        width, height = image.size
+        r, g, b = (np.frombuffer(band.tobytes(), dtype=np.uint8).astype(np.uint16)
+                   for band in image.convert('RGB').point(self.shift_table).split())
+        keys = (r << (2 * self.bits)) | (g << self.bits) | b
+        return self.lut[keys].reshape(height, width)
+
+    def ordered(self, image, mode, top=0):
+        """Ordered dithering: add the tiled threshold offsets, then look up each pixel.
+
+        Every pixel is independent, so the whole frame is a handful of
+        array operations. top is the frame row of the image's first row, so
+        that bands of a frame line up with the frame's threshold tiling.
+        """
+        width, height = image.size
+        offsets = np.roll(threshold_map(mode), -top, axis=0)
+        tile = offsets.shape[0]
+        offsets = np.tile(offsets, (-(-height // tile), -(-width // tile)))[:height, :width]
+        shift = 8 - self.bits
+        keys = np.zeros((height, width), dtype=np.uint16)
+        for band in image.convert('RGB').split():
+            channel = np.frombuffer(band.tobytes(), dtype=np.uint8).reshape(height, width)
+            channel = np.clip(channel + offsets, 0, 255).astype(np.uint16) >> shift
+            keys = (keys << self.bits) | channel
+        return self.lut[keys]
+
+    def diffuse(self, image):
+        """Floyd-Steinberg dithering to the palette."""
+        dithered = image.convert('RGB').quantize(palette=self.palette_image, dither=Image.Dither.FLOYDSTEINBERG)
+        return epdbuffer.image_indices(dithered)
+
+    def quantize(self, image, dither=DITHER_DEFAULT, top=0):
+        """Return the ink indices of an image as a (height, width) uint8 array."""
+        if dither == DITHER_NONE:
+            return self.nearest(image)
+        if dither == DITHER_DIFFUSION:
+            return self.diffuse(image)
+        if dither in (DITHER_BAYER, DITHER_BLUE_NOISE):
+            return self.ordered(image, dither, top)
+        raise ValueError("Unknown dither mode: %s" % dither)
+
+
+@lru_cache(maxsize=16)
+def get_quantizer(palette):
+    """Shared Quantizer per palette, the table is loaded or built only once."""
+    return Quantizer(palette)
+
+
+def quantize(image, palette, dither=DITHER_DEFAULT):
+    """Return the ink indices of image for palette, see Quantizer.quantize."""
+    return get_quantizer(tuple(tuple(color) for color in palette)).quantize(image, dither)
+
+
+# Parallel rendering. Frames are split into horizontal bands that a
+# persistent process pool quantizes and packs; the RGB frame and the packed
+# buffer live in shared memory, so only band coordinates go over the pipes.
+# Packed rows are padded to whole bytes, so the bands of the buffer are
+# independent slices.
+
+# Worker processes, 0 or 1 renders in the calling process
+WORKERS = int(os.environ.get('EPD_QUANT_WORKERS', 0))
+
+# Rows above a band that error diffusion runs over and then discards, so
+# the error entering the band is close to that of a serial pass
+DIFFUSION_OVERLAP = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+_shared = {}        # 'rgb' / 'packed' -> SharedMemory, parent side
+_attached = {}      # same, worker side
+
+
+def set_workers(workers):
+    """Number of worker processes for quantize_pack, 0 or 1 = no pool."""
+    global WORKERS
+    with _pool_lock:
+        if _pool is not None and workers != WORKERS:
+            _shutdown()
+        WORKERS = workers
+
+
+def _shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+    for shm in _shared.values():
+        shm.close()
+        shm.unlink()
+    _shared.clear()
+
+
+# Stop the pool and free the shared buffers on exit, registered once
+atexit.register(set_workers, 0)
+
+
+def _shared_memory(role, size):
+    # Parent side buffer, grown when a larger frame comes along
+    shm = _shared.get(role)
+    if shm is None or shm.size < size:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        shm = _shared[role] = shared_memory.SharedMemory(create=True, size=size)
+    return shm
+
+
+def _attach(role, name):
+    shm = _attached.get(role)
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        # Workers share the parent's resource tracker, which unlinks the
+        # segment once, when the parent does
+        shm = _attached[role] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _render_band(rgb_name, packed_name, width, height, y0, y1, palette, dither, bits_per_pixel):
+    rgb = np.ndarray((height, width, 3), dtype=np.uint8, buffer=_attach('rgb', rgb_name).buf)
+    top = max(0, y0 - DIFFUSION_OVERLAP) if dither == DITHER_DIFFUSION else y0
+    indices = get_quantizer(palette).quantize(Image.fromarray(rgb[top:y1], 'RGB'), dither, top)
+    packed = epdbuffer.pack_indices(indices[y0 - top:], bits_per_pixel)
+    start = y0 * (len(packed) // (y1 - y0))
+    _attach('packed', packed_name).buf[start:start + len(packed)] = packed
+
+
+def quantize_pack(image, palette, dither, bits_per_pixel):
+    """Quantize image to palette and pack it with bits_per_pixel, see pack_indices.
+
+    With WORKERS > 1 the frame is rendered in WORKERS bands by the process
+    pool. Nearest and ordered dithering give the same bytes as a serial
+    pass; error diffusion restarts every band DIFFUSION_OVERLAP rows early.
+    """
+    palette = tuple(tuple(int(c) for c in color) for color in palette)
+    width, height = image.size
+    if WORKERS <= 1 or height < 2 * WORKERS:
+        return epdbuffer.pack_indices(get_quantizer(palette).quantize(image, dither), bits_per_pixel)
+
+    global _pool
+    linewidth = (width * bits_per_pixel + 7) // 8
+    with _pool_lock:
+        if _pool is None:
+            # Workers start from a forkserver: a fork() of the multithreaded
+            # frame process could copy locks held by its other threads
+            _pool = ProcessPoolExecutor(max_workers=WORKERS,
+                                        mp_context=multiprocessing.get_context('forkserver'))
+        rgb_shm = _shared_memory('rgb', width * height * 3)
+        packed_shm = _shared_memory('packed', linewidth * height)
+        np.ndarray((height, width, 3), dtype=np.uint8, buffer=rgb_shm.buf)[:] = np.asarray(image.convert('RGB'))
+
+        rows = np.linspace(0, height, WORKERS + 1).astype(int)
+        futures = [_pool.submit(_render_band, rgb_shm.name, packed_shm.name, width, height,
+                                int(y0), int(y1), palette, dither, bits_per_pixel)
+                   for y0, y1 in zip(rows[:-1], rows[1:])]
+        for future in futures:
+            future.result()
+        return bytes(packed_shm.buf[:linewidth * height])